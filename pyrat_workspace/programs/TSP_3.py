@@ -16,63 +16,235 @@ from pyrat import *
 
 # External imports
 import numpy
+import concurrent.futures
+
+# Numba is optional, without it the compiled functions below run as plain Python
+# In that case, the search uses its Cython version from "_tsp_core.pyx" if it was built
+try:
+    from numba import njit
+    tsp_core = None
+except ImportError:
+    def njit (*args, **kwargs):
+        return lambda function: function
+    try:
+        import _tsp_core as tsp_core
+    except ImportError:
+        tsp_core = None
 
 # Previously developed functions
-from tutorial import get_neighbors
-from BFS import locations_to_actions
-from TSP_1 import graph_to_metagraph, expand_route
+from bfs import locations_to_actions
+from tsp_1 import graph_to_metagraph, expand_route, INF
 
 #####################################################################################################################################################
 ##################################################################### FUNCTIONS #####################################################################
 #####################################################################################################################################################
 
-def tsp ( complete_graph: numpy.ndarray,
-          source:         int
-        ) ->              Tuple[List[int], int]:
+@njit(cache=True)
+def _mst_length ( complete_graph: numpy.ndarray,
+                  mask:           int
+                ) ->              int:
+
+    """
+        Computes the length of a minimum spanning tree of the vertices in the bitmask, using Prim's algorithm on the dense matrix.
+        Any route going through all these vertices is a spanning tree of them, so this is a lower bound on its length.
+        In:
+            * complete_graph: Complete graph of the vertices of interest, as a contiguous int32 matrix.
+            * mask:           Vertices to span, vertex v being included if bit v is set.
+        Out:
+            * mst_length: Length of the minimum spanning tree.
+    """
+
+    # Start the tree from any vertex of the mask
+    n = complete_graph.shape[0]
+    in_tree = numpy.zeros(n, dtype=numpy.bool_)
+    distances_to_tree = numpy.full(n, INF, dtype=numpy.int64)
+    for vertex in range(n):
+        if (mask >> vertex) & 1:
+            distances_to_tree[vertex] = 0
+            break
+    
+    # Add the closest vertex to the tree until all vertices of the mask are in it
+    mst_length = 0
+    while True:
+        closest_vertex = -1
+        for vertex in range(n):
+            if (mask >> vertex) & 1 and not in_tree[vertex] and (closest_vertex == -1 or distances_to_tree[vertex] < distances_to_tree[closest_vertex]):
+                closest_vertex = vertex
+        if closest_vertex == -1:
+            break
+        in_tree[closest_vertex] = True
+        mst_length += distances_to_tree[closest_vertex]
+        for vertex in range(n):
+            if (mask >> vertex) & 1 and not in_tree[vertex] and complete_graph[closest_vertex, vertex] < distances_to_tree[vertex]:
+                distances_to_tree[vertex] = complete_graph[closest_vertex, vertex]
+    
+    # Done
+    return mst_length
+
+#####################################################################################################################################################
+
+@njit(cache=True, nogil=True)
+def _tsp_search ( complete_graph:   numpy.ndarray,
+                  sorted_neighbors: numpy.ndarray,
+                  sorted_weights:   numpy.ndarray,
+                  source:           int,
+                  first_vertex:     int,
+                  best_shared:      numpy.ndarray,
+                  best_route:       numpy.ndarray,
+                  use_min_in_bound: bool,
+                  use_mst_bound:    bool
+                ) ->                int:
+
+    """
+        Iterative version of the backtracking search among routes starting with the source and then the first vertex, compiled with Numba when available.
+        Level d of the stack stores the d-th vertex of the current route, the visited vertices as a bitmask, the length so far, and the next neighbor to try.
+        A branch is cut when its length plus a minimum spanning tree of the vertices left to visit cannot beat the best route.
+        Before computing that tree, the sum of the shortest incoming edges of these vertices is tried as a cheaper lower bound.
+        Searches for different first vertices run in parallel, and share the best length found by any of them to cut more branches.
+        It is read and written without lock, which may only make it larger than the true best, so the cut remains valid.
+        In:
+            * complete_graph:   Complete graph of the vertices of interest, as a contiguous int32 matrix.
+            * sorted_neighbors: Row u lists the neighbors of u in increasing distance.
+            * sorted_weights:   Row u lists the distances from u to the vertices in the same row of sorted_neighbors.
+            * source:           Vertex used to start the search.
+            * first_vertex:     Vertex visited right after the source.
+            * best_shared:      Array of size 1 with the best length found by all searches.
+            * best_route:       Array of size n in which the best route found is written.
+            * use_min_in_bound: Indicates if branches are cut with the shortest incoming edges bound.
+            * use_mst_bound:    Indicates if branches are cut with the minimum spanning tree bound.
+        Out:
+            * best_length: Length of the best route found, or INF if none beats the shared best.
+    """
+
+    # Each vertex left to visit will be reached by an edge at least as short as its shortest incoming edge
+    n = complete_graph.shape[0]
+    full_mask = (1 << n) - 1
+    min_in = numpy.full(n, INF, dtype=numpy.int64)
+    for vertex in range(n):
+        for neighbor in range(n):
+            if neighbor != vertex and complete_graph[neighbor, vertex] < min_in[vertex]:
+                min_in[vertex] = complete_graph[neighbor, vertex]
+
+    # Initialize the stack with the source and the first vertex
+    stack_vertex = numpy.empty(n, dtype=numpy.int64)
+    stack_mask = numpy.empty(n, dtype=numpy.int64)
+    stack_length = numpy.empty(n, dtype=numpy.int64)
+    stack_next = numpy.empty(n, dtype=numpy.int64)
+    stack_min_in = numpy.empty(n, dtype=numpy.int64)
+    stack_vertex[0], stack_mask[0], stack_length[0], stack_next[0], stack_min_in[0] = source, 1 << source, 0, n - 1, min_in.sum() - min_in[source]
+    stack_vertex[1], stack_mask[1], stack_length[1], stack_next[1], stack_min_in[1] = first_vertex, (1 << source) | (1 << first_vertex), complete_graph[source, first_vertex], 0, stack_min_in[0] - min_in[first_vertex]
+    best_length = INF
+    if stack_mask[1] == full_mask:
+        best_route[:2] = stack_vertex[:2]
+        best_length = stack_length[1]
+    
+    # Lower bounds only depend on the vertices left to visit, so they are computed once per set
+    mst_lengths = dict()
+    
+    # Explore the neighbors of the top of the stack one at a time
+    top = 1
+    while top >= 1:
+
+        # All neighbors have been tried, we backtrack
+        if stack_next[top] == n - 1:
+            top -= 1
+            continue
+
+        # Get the next neighbor to try
+        current_vertex = stack_vertex[top]
+        k = stack_next[top]
+        vertex = sorted_neighbors[current_vertex, k]
+        stack_next[top] += 1
+        if (stack_mask[top] >> vertex) & 1:
+            continue
+
+        # Backtracking, with the shortest incoming edges of the vertices left to visit as a cheap lower bound
+        length = stack_length[top] + sorted_weights[current_vertex, k]
+        remaining_min_in = stack_min_in[top] - min_in[vertex]
+        bound = min(best_length, best_shared[0])
+        if length + (remaining_min_in if use_min_in_bound else 0) >= bound:
+            continue
+
+        # If we have a full path, it is better than the current best
+        mask = stack_mask[top] | (1 << vertex)
+        if mask == full_mask:
+            best_route[:top + 1] = stack_vertex[:top + 1]
+            best_route[top + 1] = vertex
+            best_length = length
+            if length < best_shared[0]:
+                best_shared[0] = length
+            continue
+
+        # The rest of the route spans the unvisited vertices and the new current one
+        remaining_mask = (full_mask ^ mask) | (1 << vertex)
+        if use_mst_bound:
+            if remaining_mask not in mst_lengths:
+                mst_lengths[remaining_mask] = _mst_length(complete_graph, remaining_mask)
+            if length + mst_lengths[remaining_mask] >= bound:
+                continue
+
+        # Otherwise, we go one level deeper
+        top += 1
+        stack_vertex[top], stack_mask[top], stack_length[top], stack_next[top], stack_min_in[top] = vertex, mask, length, 0, remaining_min_in
+    
+    # Done
+    return best_length
+
+#####################################################################################################################################################
+
+def tsp ( complete_graph:   numpy.ndarray,
+          source:           int,
+          sort_neighbors:   bool = True,
+          use_min_in_bound: bool = True,
+          use_mst_bound:    bool = True
+        ) ->                Tuple[List[int], int]:
 
     """
         Function to solve the TSP using an exhaustive search.
-        The backtracking mechanism allows stopping exploration of some branches.
+        The backtracking mechanism allows stopping exploration of some branches, using a minimum spanning tree of the remaining vertices as a lower bound.
         Vertices are explored in increasing distance to quickly find a good solution and cut more branches.
+        The subtrees of the neighbors of the source are explored in parallel threads, which run without the GIL when compiled with Numba.
+        Each of these improvements can be disabled, which gives the same best length, only more slowly.
         In:
-            * complete_graph: Complete graph of the vertices of interest.
-            * source:         Vertex used to start the search.
+            * complete_graph:   Complete graph of the vertices of interest.
+            * source:           Vertex used to start the search.
+            * sort_neighbors:   Indicates if neighbors are explored in increasing distance, or in increasing index.
+            * use_min_in_bound: Indicates if branches are cut with the shortest incoming edges bound.
+            * use_mst_bound:    Indicates if branches are cut with the minimum spanning tree bound.
         Out:
             * best_route:  Best route found in the search.
             * best_length: Length of the best route found.
     """
     
-    # We sort the neighbors in increasing distance
-    sorted_neighbors = {}
-    for vertex in range(complete_graph.shape[0]):
-        neighbors = get_neighbors(vertex, complete_graph)
-        neighbors_weights = [complete_graph[vertex, neighbor] for neighbor in neighbors]
-        sorted_neighbors[vertex] = [neighbors[i] for i in numpy.argsort(neighbors_weights)]
+    # Nothing to search if the source is alone
+    n = complete_graph.shape[0]
+    if n == 1:
+        return [source], 0
     
-    # Subfunction for recursive calls
-    def _tsp (current_vertex, current_visited_vertices, current_route, current_length, current_best_route, current_best_length):
-        
-        # Backtracking
-        if current_length >= current_best_length:
-            return current_best_route, current_best_length
-        
-        # If we have a full path, we evaluate it
-        if len(current_visited_vertices) == complete_graph.shape[0]:
-            if current_length >= current_best_length:
-                return current_best_route, current_best_length
-            return current_route, current_length
-        
-        # Otherwise, we explore one more neighbor
-        for vertex in sorted_neighbors[current_vertex]:
-            if vertex not in current_visited_vertices:
-                current_best_route, current_best_length = _tsp(vertex, current_visited_vertices + [vertex], current_route + [vertex], current_length + complete_graph[current_vertex, vertex], current_best_route, current_best_length)
-        
-        # We propagate the current best
-        return current_best_route, current_best_length
+    # We sort the neighbors in increasing distance, and remove each vertex from its own row
+    order = numpy.argsort(complete_graph, axis=1, kind="stable") if sort_neighbors else numpy.tile(numpy.arange(n), (n, 1))
+    order = order[order != numpy.arange(n)[:, None]].reshape(n, n - 1)
+    sorted_neighbors = order.astype(numpy.int32)
+    sorted_weights = numpy.take_along_axis(complete_graph, order, axis=1).astype(numpy.int32)
     
-    # Initialize the search from the source
-    best_route, best_length = _tsp(source, [source], [source], 0, None, float("inf"))
-    return best_route, best_length
+    # Search from each neighbor of the source in parallel, closest ones being submitted first
+    complete_graph = numpy.ascontiguousarray(complete_graph, dtype=numpy.int32)
+    best_shared = numpy.full(1, INF, dtype=numpy.int64)
+    best_routes = numpy.zeros((n - 1, n), dtype=numpy.int64)
+    search = _tsp_search if tsp_core is None else tsp_core.tsp_search
+    def _tsp_subtree (i):
+        return search(complete_graph, sorted_neighbors, sorted_weights, source, sorted_neighbors[source, i], best_shared, best_routes[i], use_min_in_bound, use_mst_bound)
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        best_lengths = list(executor.map(_tsp_subtree, range(n - 1)))
+    
+    # Keep the best of all subtrees
+    best = int(numpy.argmin(best_lengths))
+    return best_routes[best].tolist(), int(best_lengths[best])
+
+# Compile once at import so that the first preprocessing does not pay for it
+# The search is called directly, as threads started during the import would wait for it to finish before compiling
+if tsp_core is None:
+    _tsp_search(numpy.ones((3, 3), dtype=numpy.int32), numpy.array([[1, 2], [0, 2], [0, 1]], dtype=numpy.int32), numpy.ones((3, 2), dtype=numpy.int32), 0, numpy.int32(1), numpy.full(1, INF, dtype=numpy.int64), numpy.zeros(3, dtype=numpy.int64), True, True)
     
 #####################################################################################################################################################
 ##################################################### EXECUTED ONCE AT THE BEGINNING OF THE GAME ####################################################
@@ -0,0 +1,207 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+
+#####################################################################################################################################################
+######################################################################## INFO #######################################################################
+#####################################################################################################################################################
+
+"""
+    This module is a Cython version of the search of "TSP_3.py", which is used by that program when Numba is not installed.
+    The whole search runs without the GIL, so the parallel searches of "TSP_3.py" also run in parallel with it.
+    It has to be compiled once, from this directory, with:
+        cythonize -3 --inplace _tsp_core.pyx
+"""
+
+#####################################################################################################################################################
+###################################################################### IMPORTS ######################################################################
+#####################################################################################################################################################
+
+# External imports
+from libc.stdlib cimport malloc, free
+
+#####################################################################################################################################################
+############################################################### CONSTANTS & VARIABLES ###############################################################
+#####################################################################################################################################################
+
+# Same value as INF in "tsp_1.py"
+cdef long long INF = 10**18
+
+#####################################################################################################################################################
+##################################################################### FUNCTIONS #####################################################################
+#####################################################################################################################################################
+
+cdef long long _mst_length ( const int[:, ::1] complete_graph,
+                             unsigned long long mask,
+                             long long*         distances_to_tree,
+                             char*              in_tree
+                           ) noexcept nogil:
+
+    """
+        Computes the length of a minimum spanning tree of the vertices in the bitmask, using Prim's algorithm on the dense matrix.
+        In:
+            * complete_graph:    Complete graph of the vertices of interest.
+            * mask:              Vertices to span, vertex v being included if bit v is set.
+            * distances_to_tree: Buffer of size n used by the algorithm.
+            * in_tree:           Buffer of size n used by the algorithm.
+        Out:
+            * mst_length: Length of the minimum spanning tree.
+    """
+
+    # Start the tree from any vertex of the mask
+    cdef int n = complete_graph.shape[0]
+    cdef int vertex, closest_vertex
+    cdef long long mst_length = 0
+    for vertex in range(n):
+        distances_to_tree[vertex] = INF
+        in_tree[vertex] = 0
+    for vertex in range(n):
+        if (mask >> vertex) & 1:
+            distances_to_tree[vertex] = 0
+            break
+
+    # Add the closest vertex to the tree until all vertices of the mask are in it
+    while True:
+        closest_vertex = -1
+        for vertex in range(n):
+            if (mask >> vertex) & 1 and not in_tree[vertex] and (closest_vertex == -1 or distances_to_tree[vertex] < distances_to_tree[closest_vertex]):
+                closest_vertex = vertex
+        if closest_vertex == -1:
+            break
+        in_tree[closest_vertex] = 1
+        mst_length += distances_to_tree[closest_vertex]
+        for vertex in range(n):
+            if (mask >> vertex) & 1 and not in_tree[vertex] and complete_graph[closest_vertex, vertex] < distances_to_tree[vertex]:
+                distances_to_tree[vertex] = complete_graph[closest_vertex, vertex]
+
+    # Done
+    return mst_length
+
+#####################################################################################################################################################
+
+def tsp_search ( const int[:, ::1] complete_graph,
+                 const int[:, ::1] sorted_neighbors,
+                 const int[:, ::1] sorted_weights,
+                 int               source,
+                 int               first_vertex,
+                 long long[::1]    best_shared,
+                 long long[::1]    best_route,
+                 bint              use_min_in_bound,
+                 bint              use_mst_bound
+               ):
+
+    """
+        Same as "_tsp_search" in "TSP_3.py", with the same arguments.
+        Unlike the Numba version, which caches in a dictionary the spanning tree length of each set of vertices left to visit, this one recomputes it each time.
+        Computing it in C is cheap compared to a dictionary lookup, which would also need the GIL.
+        Raises MemoryError if the buffers of the search cannot be allocated.
+        In:
+            * complete_graph:   Complete graph of the vertices of interest, as a contiguous int32 matrix.
+            * sorted_neighbors: Row u lists the neighbors of u in increasing distance.
+            * sorted_weights:   Row u lists the distances from u to the vertices in the same row of sorted_neighbors.
+            * source:           Vertex used to start the search.
+            * first_vertex:     Vertex visited right after the source.
+            * best_shared:      Array of size 1 with the best length found by all searches.
+            * best_route:       Array of size n in which the best route found is written.
+            * use_min_in_bound: Indicates if branches are cut with the shortest incoming edges bound.
+            * use_mst_bound:    Indicates if branches are cut with the minimum spanning tree bound.
+        Out:
+            * best_length: Length of the best route found, or INF if none beats the shared best.
+    """
+
+    # Buffers for the stack and the lower bound
+    cdef int n = sorted_neighbors.shape[0]
+    cdef unsigned long long full_mask = (1ULL << n) - 1
+    cdef long long* stack_vertex = <long long*> malloc(n * sizeof(long long))
+    cdef unsigned long long* stack_mask = <unsigned long long*> malloc(n * sizeof(unsigned long long))
+    cdef long long* stack_length = <long long*> malloc(n * sizeof(long long))
+    cdef long long* stack_next = <long long*> malloc(n * sizeof(long long))
+    cdef long long* stack_min_in = <long long*> malloc(n * sizeof(long long))
+    cdef long long* min_in = <long long*> malloc(n * sizeof(long long))
+    cdef long long* distances_to_tree = <long long*> malloc(n * sizeof(long long))
+    cdef char* in_tree = <char*> malloc(n * sizeof(char))
+    cdef int top, i, current_vertex, vertex, neighbor
+    cdef long long k, length, bound, best_length, remaining_min_in, min_in_sum
+    cdef unsigned long long mask
+
+    # Search only if all buffers were allocated, and free them in any case, free doing nothing on those that are NULL
+    try:
+        if stack_vertex == NULL or stack_mask == NULL or stack_length == NULL or stack_next == NULL or stack_min_in == NULL or min_in == NULL or distances_to_tree == NULL or in_tree == NULL:
+            raise MemoryError()
+
+        # Same search as the Python version
+        with nogil:
+
+            # Shortest incoming edge of each vertex
+            min_in_sum = 0
+            for vertex in range(n):
+                min_in[vertex] = INF
+                for neighbor in range(n):
+                    if neighbor != vertex and complete_graph[neighbor, vertex] < min_in[vertex]:
+                        min_in[vertex] = complete_graph[neighbor, vertex]
+                min_in_sum += min_in[vertex]
+
+            # Initialize the stack with the source and the first vertex
+            stack_vertex[0], stack_mask[0], stack_length[0], stack_next[0], stack_min_in[0] = source, 1ULL << source, 0, n - 1, min_in_sum - min_in[source]
+            stack_vertex[1], stack_mask[1], stack_length[1], stack_next[1], stack_min_in[1] = first_vertex, (1ULL << source) | (1ULL << first_vertex), complete_graph[source, first_vertex], 0, stack_min_in[0] - min_in[first_vertex]
+            best_length = INF
+            if stack_mask[1] == full_mask:
+                best_route[0], best_route[1] = source, first_vertex
+                best_length = stack_length[1]
+
+            # Explore the neighbors of the top of the stack one at a time
+            top = 1
+            while top >= 1:
+
+                # All neighbors have been tried, we backtrack
+                if stack_next[top] == n - 1:
+                    top -= 1
+                    continue
+
+                # Get the next neighbor to try
+                current_vertex = stack_vertex[top]
+                k = stack_next[top]
+                vertex = sorted_neighbors[current_vertex, k]
+                stack_next[top] += 1
+                if (stack_mask[top] >> vertex) & 1:
+                    continue
+
+                # Backtracking, with the shortest incoming edges of the vertices left to visit as a cheap lower bound
+                length = stack_length[top] + sorted_weights[current_vertex, k]
+                remaining_min_in = stack_min_in[top] - min_in[vertex]
+                bound = best_length if best_length < best_shared[0] else best_shared[0]
+                if length + (remaining_min_in if use_min_in_bound else 0) >= bound:
+                    continue
+
+                # If we have a full path, it is better than the current best
+                mask = stack_mask[top] | (1ULL << vertex)
+                if mask == full_mask:
+                    for i in range(top + 1):
+                        best_route[i] = stack_vertex[i]
+                    best_route[top + 1] = vertex
+                    best_length = length
+                    if length < best_shared[0]:
+                        best_shared[0] = length
+                    continue
+
+                # The rest of the route spans the unvisited vertices and the new current one
+                if use_mst_bound and length + _mst_length(complete_graph, (full_mask ^ mask) | (1ULL << vertex), distances_to_tree, in_tree) >= bound:
+                    continue
+
+                # Otherwise, we go one level deeper
+                top += 1
+                stack_vertex[top], stack_mask[top], stack_length[top], stack_next[top], stack_min_in[top] = vertex, mask, length, 0, remaining_min_in
+
+    finally:
+        free(stack_vertex)
+        free(stack_mask)
+        free(stack_length)
+        free(stack_next)
+        free(stack_min_in)
+        free(min_in)
+        free(distances_to_tree)
+        free(in_tree)
+
+    # Done
+    return best_length
+
+#####################################################################################################################################################
+#####################################################################################################################################################
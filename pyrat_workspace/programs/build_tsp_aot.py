@@ -0,0 +1,43 @@
+#####################################################################################################################################################
+######################################################################## INFO #######################################################################
+#####################################################################################################################################################
+
+"""
+    This script compiles the Held-Karp algorithm of "tsp_1.py" ahead of time with Numba, in a module "tsp_native" placed in this directory.
+    Once built, "tsp_1.py" and the programs using its "tsp_held_karp" function load it instead of compiling at each game.
+    It has to be run once, from this directory, with:
+        python build_tsp_aot.py
+    Note that "numba.pycc" is pending deprecation since Numba 0.57, and may be removed in a future version without a replacement yet.
+    This step is optional, as "tsp_1.py" falls back to compiling "_held_karp" with Numba when "tsp_native" cannot be imported.
+    The tests in "tests/build_tsp_aot_tests.py" check that a built module gives the same results as the compiled function.
+"""
+
+#####################################################################################################################################################
+###################################################################### IMPORTS ######################################################################
+#####################################################################################################################################################
+
+# External imports
+import os
+from numba.pycc import CC
+
+# Previously developed functions
+from tsp_1 import _held_karp
+
+#####################################################################################################################################################
+######################################################################## GO! ########################################################################
+#####################################################################################################################################################
+
+if __name__ == "__main__":
+
+    # Export the Held-Karp algorithm, with a route given as an int32 array and the length returned as an int64
+    cc = CC("tsp_native")
+    cc.output_dir = os.path.dirname(os.path.realpath(__file__))
+    @cc.export("solve_tsp", "i8(i4[:, ::1], i8, i4[::1])")
+    def solve_tsp (complete_graph, source, route):
+        return _held_karp(complete_graph, source, route)
+    
+    # Compile the module
+    cc.compile()
+
+#####################################################################################################################################################
+#####################################################################################################################################################
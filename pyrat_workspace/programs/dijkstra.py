@@ -120,13 +120,13 @@ def dijkstra ( source: int,
 
 #####################################################################################################################################################
 
-def find_route(routing_table: Dict[int, Union[None, int]],
+def find_route(routing_table: Union[numpy.ndarray, Dict[int, Union[None, int]]],
                source: int,
                target: int) -> List[int]:
     """
     Function to return a sequence of locations using a provided routing table.
     In:
-        * routing_table: Routing table as obtained by the traversal.
+        * routing_table: Routing table as obtained by the traversal, or array of predecessors with -1 for vertices without one.
         * source:        Vertex from which we start the route (should be the one matching the routing table).
         * target:        Target to reach using the routing table.
     Out:
@@ -134,7 +134,11 @@ def find_route(routing_table: Dict[int, Union[None, int]],
     """
 
     # Check if the target exists in the routing table
-    if target not in routing_table:
+    if isinstance(routing_table, numpy.ndarray):
+        reachable = target == source or routing_table[target] != -1
+    else:
+        reachable = target in routing_table
+    if not reachable:
         raise ValueError("The target is not reachable from the source.")
     
     route = [target]
@@ -142,7 +146,7 @@ def find_route(routing_table: Dict[int, Union[None, int]],
     
     # Using a while loop and appending to the route instead of inserting at the beginning
     while current_vertex != source:
-        current_vertex = routing_table[current_vertex]
+        current_vertex = int(routing_table[current_vertex])
         route.append(current_vertex)
     
     return route[::-1] 
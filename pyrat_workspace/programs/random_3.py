@@ -102,10 +102,16 @@ def turn ( maze:             Union[numpy.ndarray, Dict[int, Dict[int, int]]],
         memory.visited_cells.append(player_locations[name])
 
     # Go to an unvisited neighbor in priority
+    # It is drawn uniformly in a single pass, the k-th unvisited neighbor replacing the previous choice with probability 1/k
     neighbors = get_neighbors(player_locations[name], maze)
-    unvisited_neighbors = [neighbor for neighbor in neighbors if neighbor not in memory.visited_cells]
-    if len(unvisited_neighbors) > 0:
-        neighbor = random.choice(unvisited_neighbors)
+    neighbor = None
+    nb_unvisited_neighbors = 0
+    for candidate in neighbors:
+        if candidate not in memory.visited_cells:
+            nb_unvisited_neighbors += 1
+            if random.random() * nb_unvisited_neighbors < 1:
+                neighbor = candidate
+    if nb_unvisited_neighbors > 0:
         memory.visited_cells.append(neighbor)
         
     # If there is no unvisited neighbor, choose one randomly
@@ -5,9 +5,10 @@
 """
     This program is an improvement of "random_2".
     Here, we add elements that help us explore better the maze.
-    More precisely, we keep a list (in a global variable to be updated at each turn) of cells that have already been visited in the game.
-    Then, at each turn, we choose in priority a random move among those that lead us to an unvisited cell.
-    If no such move exists, we move randomly using the method in "random_2".
+    More precisely, we keep in memory a bytearray with one entry per cell, set to 1 once that cell has been visited in the game.
+    We also keep the explored path as a stack of (cell, iterator) pairs, the iterator giving the neighbors of that cell in a random order.
+    Then, at each turn, we move to the next unvisited neighbor given by the iterator on top of the stack.
+    If no such neighbor remains, we pop the stack and go back one cell along the explored path, as in a depth-first search.
 """
 
 #####################################################################################################################################################
@@ -19,9 +20,10 @@ from pyrat import *
 
 # External imports 
 import random
+import numpy
 
 # Previously developed functions
-from tutorial import get_neighbors, locations_to_action
+from tutorial import get_neighbors
 
 #####################################################################################################################################################
 ##################################################### EXECUTED ONCE AT THE BEGINNING OF THE GAME ####################################################
@@ -57,9 +59,20 @@ def preprocessing ( maze:             Union[numpy.ndarray, Dict[int, Dict[int, i
             * None.
     """
 
-    # To store the already visited cells
-    memory.visited_cells = []
-    memory.trajectory = []
+    # To store the already visited cells, as one byte per cell set to 1 once visited
+    memory.visited_cells = bytearray(maze_width * maze_height)
+
+    # Stack of the explored path, each cell coming with an iterator over its neighbors left to try
+    memory.stack = []
+
+    # Adjacency of the maze in compressed sparse row format, the neighbors of cell c being indices[indptr[c]:indptr[c + 1]]
+    neighbors = [get_neighbors(cell, maze) if isinstance(maze, numpy.ndarray) or cell in maze else [] for cell in range(maze_width * maze_height)]
+    memory.indptr = numpy.zeros(len(neighbors) + 1, dtype=numpy.int32)
+    memory.indptr[1:] = numpy.cumsum([len(cell_neighbors) for cell_neighbors in neighbors])
+    memory.indices = numpy.array([neighbor for cell_neighbors in neighbors for neighbor in cell_neighbors], dtype=numpy.int32)
+
+    # Action to perform for each difference between the target and the source, as in "locations_to_action"
+    memory.delta_to_action = {0: "nothing", -1: "west", 1: "east", maze_width: "south", -maze_width: "north"}
 
 #####################################################################################################################################################
 ######################################################### EXECUTED AT EACH TURN OF THE GAME #########################################################
@@ -98,35 +111,30 @@ def turn ( maze:             Union[numpy.ndarray, Dict[int, Dict[int, int]]],
             * action: One of the possible actions, as given in possible_actions.
     """
 
-    # Mark current cell as visited
-    if player_locations[name] not in memory.visited_cells:
-        memory.visited_cells.append(player_locations[name])
-
-    memory.trajectory.append(player_locations[name])
-
-    # Go to an unvisited neighbor in priority
-    neighbors = get_neighbors(player_locations[name], maze)
-    unvisited_neighbors = [neighbor for neighbor in neighbors if neighbor not in memory.visited_cells]
-    if len(unvisited_neighbors) > 0:
-        neighbor = random.choice(unvisited_neighbors)
-        memory.visited_cells.append(neighbor)
-        
-    # If there is no unvisited neighbor, choose one randomly
-    else:
-        
-        if len(memory.trajectory )> 0 :
-        
-            memory.trajectory.pop()
-            neighbor = memory.trajectory[-1]
-            memory.trajectory.pop()
-        
-        else :
-        
-            neighbor = random.choice(neighbors)
-
-    
+    # When reaching a cell for the first time, mark it as visited and start exploring its neighbors in random order
+    neighbors = memory.indices[memory.indptr[player_locations[name]]:memory.indptr[player_locations[name] + 1]].tolist()
+    if memory.visited_cells[player_locations[name]] == 0:
+        memory.visited_cells[player_locations[name]] = 1
+        random.shuffle(neighbors)
+        memory.stack.append((player_locations[name], iter(neighbors)))
+
+    # Go to the next unvisited neighbor of the current cell, which is the top of the stack
+    neighbor = None
+    if len(memory.stack) > 0:
+        neighbor = next((cell for cell in memory.stack[-1][1] if memory.visited_cells[cell] == 0), None)
+
+        # If there is no unvisited neighbor, we go back to the cell from which we reached the current one
+        if neighbor is None:
+            memory.stack.pop()
+            if len(memory.stack) > 0:
+                neighbor = memory.stack[-1][0]
+
+    # Once the whole maze is explored, move randomly
+    if neighbor is None:
+        neighbor = random.choice(neighbors)
+
     # Retrieve the corresponding action
-    action = locations_to_action(player_locations[name], neighbor, maze_width)
+    action = memory.delta_to_action[neighbor - player_locations[name]]
     return action
 
 #####################################################################################################################################################
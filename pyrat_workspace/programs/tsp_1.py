@@ -21,7 +21,24 @@
 from pyrat import *
 
 # External imports 
-# [TODO] Put all your standard imports (numpy, random, os, heapq...) here
+import numpy
+import operator
+import os
+import hashlib
+import concurrent.futures
+
+# Numba is optional, without it the compiled functions below run as plain Python
+try:
+    from numba import njit
+except ImportError:
+    def njit (*args, **kwargs):
+        return lambda function: function
+
+# Held-Karp compiled ahead of time by "build_tsp_aot.py", if it was built, so that no game pays for the compilation
+try:
+    import tsp_native
+except ImportError:
+    tsp_native = None
 
 # Previously developed functions
 from dijkstra import *
@@ -30,14 +47,107 @@ from dijkstra import *
 ############################################################### CONSTANTS & VARIABLES ###############################################################
 #####################################################################################################################################################
 
+# Integer used as infinity in compiled code, large enough for any route and small enough to add a distance without overflow
+INF = 10**18
+
+# Same for int32 tables, half of the largest int32 so that adding a distance cannot overflow
+# Distances fit easily, as a maze route is at most the number of cells times the largest mud weight, far below 2^31
+INF_32 = numpy.iinfo(numpy.int32).max // 2
+
+# Results of Dijkstra's algorithm, indexed by (hash of the graph contents, source), kept across calls to reuse them when the same maze is given again
+# Hashing the contents lets a new game on the same maze hit the cache, and the cache does not keep the graphs themselves alive
+DIJKSTRA_CACHE = {}
+DIJKSTRA_CACHE_SIZE = 4096
+
+# Minimum work, in number of sources times number of cells, for which Dijkstra's algorithm is run in several processes
+# A search costs about 2 microseconds per cell, so this is about 0.5 seconds of serial work, several times the 20 to 80 milliseconds needed to start the processes
+# Games of usual sizes, such as 22 sources in a 15x11 maze, stay far below and run serially
+PARALLEL_DIJKSTRA_MIN_WORK = 250000
+
+# Graph given to each process running Dijkstra's algorithm, sent once when the process starts instead of with each source
+_worker_graph = None
 
 #####################################################################################################################################################
 ##################################################################### FUNCTIONS #####################################################################
 #####################################################################################################################################################
 
+def _init_dijkstra_worker ( graph: Union[numpy.ndarray, Dict[int, Dict[int, int]]]
+                          ) ->     None:
+    """
+        Stores the graph in a process running Dijkstra's algorithm.
+        In:
+            * graph: Graph in which to run the algorithm.
+        Out:
+            * None.
+    """
+    global _worker_graph
+    _worker_graph = graph
+
+#####################################################################################################################################################
+
+def _dijkstra_worker ( source: int
+                     ) ->      Tuple[Dict[int, int], Dict[int, Union[None, int]]]:
+    """
+        Runs Dijkstra's algorithm from a source, in the graph stored by "_init_dijkstra_worker".
+        In:
+            * source: Vertex from which to start the algorithm.
+        Out:
+            * distances_to_explored_vertices: Distances from the source to each explored vertex.
+            * routing_table:                  Routing table obtained during the traversal.
+    """
+    return dijkstra(source, _worker_graph)
+
+#####################################################################################################################################################
+
+def parallel_dijkstra ( graph:   Union[numpy.ndarray, Dict[int, Dict[int, int]]],
+                        sources: List[int]
+                      ) ->       Dict[int, Tuple[Dict[int, int], Dict[int, Union[None, int]]]]:
+    """
+        Runs Dijkstra's algorithm from each source, in several processes when the searches are long enough and there are several CPU cores.
+        In:
+            * graph:   Graph in which to run the algorithm.
+            * sources: Vertices from which to start the algorithm.
+        Out:
+            * results: Dictionary giving the distances and routing table obtained from each source.
+    """
+    
+    # The searches are independent, so they are split among processes that each receive the graph once
+    graph_size = graph.shape[0] if isinstance(graph, numpy.ndarray) else len(graph)
+    nb_processes = min(os.cpu_count() or 1, len(sources))
+    if len(sources) * graph_size >= PARALLEL_DIJKSTRA_MIN_WORK and nb_processes > 1:
+        with concurrent.futures.ProcessPoolExecutor(nb_processes, initializer=_init_dijkstra_worker, initargs=(graph,)) as executor:
+            return dict(zip(sources, executor.map(_dijkstra_worker, sources, chunksize=-(-len(sources) // nb_processes))))
+    
+    # Otherwise, they are run one after the other
+    return {source: dijkstra(source, graph) for source in sources}
+
+#####################################################################################################################################################
+
+def _graph_hash ( graph: Union[numpy.ndarray, Dict[int, Dict[int, int]]]
+                ) ->     bytes:
+
+    """
+        Computes a hash of the contents of a graph, equal for two graphs with the same edges and weights.
+        In:
+            * graph: Graph to hash, as a matrix or a dictionary.
+        Out:
+            * digest: Hash of the graph.
+    """
+
+    # Matrices are hashed as raw bytes, dictionaries as their sorted edges
+    hasher = hashlib.blake2b(digest_size=16)
+    if isinstance(graph, numpy.ndarray):
+        hasher.update(repr((graph.shape, graph.dtype.str)).encode())
+        hasher.update(numpy.ascontiguousarray(graph).tobytes())
+    else:
+        hasher.update(repr(sorted((vertex, sorted(neighbors.items())) for vertex, neighbors in graph.items())).encode())
+    return hasher.digest()
+
+#####################################################################################################################################################
+
 def graph_to_metagraph(graph : Union[numpy.ndarray, Dict[int, Dict[int, int]]],
                          vertices: List[int]
-                        ) -> Tuple[numpy.ndarray, Dict[int, Union[None, int]]] :
+                        ) -> Tuple[numpy.ndarray, numpy.ndarray] :
     """
         Function to build a complete graph out of locations of interest in a given graph.
         In:
@@ -45,27 +155,31 @@ def graph_to_metagraph(graph : Union[numpy.ndarray, Dict[int, Dict[int, int]]],
             * vertices: Vertices to use in the complete graph.
         Out:
             * complete_graph: Complete graph of the vertices of interest.
-            * routing_tables: Dictionary of routing tables obtained by traversals used to build the complete graph.
+            * routing_tables: Routing tables obtained by traversals used to build the complete graph, row i giving the predecessor of each cell from vertices[i], or -1 if none.
     """
-    complete_graph = {}  # Dictionary to store the complete graph.
-    routing_tables = {}  # Dictionary to store routing tables for each vertex.
-
-    for vertex1 in vertices:
-        # Apply Dijkstra's algorithm to each vertex to find shortest paths.
-        distances, routing_tables[vertex1] = dijkstra(vertex1, graph)
-
-        # Populate the complete graph with distances to other vertices.
-        for cheese in vertices:
-
-            if cheese != vertex1:
-            
-                if vertex1 not in complete_graph:
-
-                    complete_graph[vertex1] = {cheese: distances[cheese]}
-                
-                else:
-                    
-                    complete_graph[vertex1][cheese] = distances[cheese]
+    graph_size = graph.shape[0] if isinstance(graph, numpy.ndarray) else max(graph) + 1  # Number of cells, including those with no neighbors.
+    complete_graph = numpy.zeros((len(vertices), len(vertices)), dtype=numpy.int32)  # Vertex i of the complete graph is vertices[i].
+    routing_tables = numpy.full((len(vertices), graph_size), -1, dtype=numpy.int32)  # Row i is the routing table from vertices[i].
+    get_distances = operator.itemgetter(*vertices)  # Gathers the distances to all vertices of interest in a single call.
+
+    # Apply Dijkstra's algorithm to each vertex to find shortest paths, unless it was already done on a graph with the same contents.
+    # Cached results are read before storing new ones, as storing them may evict entries of this graph.
+    key = _graph_hash(graph)
+    cached = {vertex: DIJKSTRA_CACHE[(key, vertex)] for vertex in vertices if (key, vertex) in DIJKSTRA_CACHE}
+    results = parallel_dijkstra(graph, [vertex for vertex in dict.fromkeys(vertices) if vertex not in cached])
+
+    for i in range(len(vertices)):
+        if vertices[i] in cached:
+            distances_to_explored_vertices, routing_tables[i] = cached[vertices[i]]
+        else:
+            distances_to_explored_vertices, routing_table = results[vertices[i]]
+            routing_tables[i, list(routing_table.keys())] = [-1 if parent is None else parent for parent in routing_table.values()]
+            if len(DIJKSTRA_CACHE) >= DIJKSTRA_CACHE_SIZE:
+                del DIJKSTRA_CACHE[next(iter(DIJKSTRA_CACHE))]
+            DIJKSTRA_CACHE[(key, vertices[i])] = (distances_to_explored_vertices, routing_tables[i].copy())
+
+        # Populate the row of the complete graph with distances to other vertices.
+        complete_graph[i] = get_distances(distances_to_explored_vertices)
 
     return complete_graph, routing_tables
 
@@ -80,6 +194,7 @@ def tsp ( complete_graph: Dict[int, Dict[int, Union[None, int]]],
     
     """
         Function to solve the TSP using an exhaustive search.
+        Searches starting from the same vertex with the same visited vertices have the same best completion, so it is memoized.
         In:
             * complete_graph: Complete graph of the vertices of interest.
             * source:         Vertex used to start the search.
@@ -90,40 +205,155 @@ def tsp ( complete_graph: Dict[int, Dict[int, Union[None, int]]],
             * best_route:  Best route found in the search.
             * best_length: Length of the best route found.
     """
-    memory.best_route = []  # Initialize best route found.
-    memory.best_length = float('inf')  # Initialize length of best route with a large number.
-
-    def brute_force(graph, vertex, length, route):
+    n = len(complete_graph)  # Number of vertices, either rows of a matrix or keys of a dictionary.
+    full_mask = (1 << n) - 1  # Bitmask with all vertices visited.
+    all_vertices = range(n)  # The graph is complete, so all other vertices are neighbors.
+    graph_flat = [complete_graph[u][v] if u != v else 0 for u in all_vertices for v in all_vertices]  # Distance from u to v is at index u * n + v.
+    memo = {}  # Length of the best completion, indexed by (current vertex, visited vertices).
+    choice = {}  # Next vertex of the best completion, with the same indices.
+
+    def brute_force(graph, vertex, row_base, visited_mask):
         """
         Recursive helper function to explore all possible routes.
 
         Args:
-            * graph (dict): The complete graph.
+            * graph (list): The complete graph, flattened row by row.
             * vertex (int): The current vertex.
-            * length (int): The length of the route so far.
-            * route (list): The route taken so far.
+            * row_base (int): Index of the row of the current vertex in the flattened graph.
+            * visited_mask (int): The visited vertices, vertex v being visited if bit v is set.
+
+        Returns:
+            * length (int): The length of the best route visiting all remaining vertices from the current one.
         """
-        # Base case: if all vertices are visited, update best route and length.
-        if len(route) == len(graph):
-            
-            if length < memory.best_length:
-                memory.best_route = route
-                memory.best_length = length
-            return
+        # Base case: if all vertices are visited, there is nothing left to do.
+        if visited_mask == full_mask:
+            return 0
         
-        # Recursive case: explore unvisited neighbors.
-        for neighbor in graph[vertex]:
-            if neighbor not in route:
-                brute_force(graph, neighbor, length + graph[vertex][neighbor], route + [neighbor])
+        # Recursive case: explore unvisited neighbors, the current vertex being already visited, unless done already.
+        key = (vertex, visited_mask)
+        if key not in memo:
+            memo[key] = INF
+            for neighbor in all_vertices:
+                if not (visited_mask >> neighbor) & 1:
+                    length = graph[row_base + neighbor] + brute_force(graph, neighbor, neighbor * n, visited_mask | (1 << neighbor))
+                    if length < memo[key]:
+                        memo[key] = length
+                        choice[key] = neighbor
+        return memo[key]
 
     # Start the recursive TSP search from source.
-    brute_force(complete_graph, source, 0, [source])
+    memory.best_length = brute_force(graph_flat, source, source * n, 1 << source)
+
+    # Follow the best choices from the source to rebuild the route.
+    memory.best_route = [source]
+    visited_mask = 1 << source
+    while visited_mask != full_mask:
+        memory.best_route.append(choice[(memory.best_route[-1], visited_mask)])
+        visited_mask |= 1 << memory.best_route[-1]
     return memory.best_route, memory.best_length
 
 #####################################################################################################################################################
 
+@njit(cache=True, boundscheck=False)
+def _held_karp_tables ( complete_graph: numpy.ndarray,
+                        source:         int,
+                        dp:             numpy.ndarray,
+                        parent:         numpy.ndarray
+                      ) ->              None:
+
+    """
+        Fills the tables of the Held-Karp algorithm, compiled with Numba when available.
+        In:
+            * complete_graph: Complete graph of the vertices of interest, as a contiguous int32 matrix.
+            * source:         Vertex used to start the search.
+            * dp:             Table of best lengths indexed by (visited vertices, last vertex), filled with INF_32.
+            * parent:         Table of predecessors with the same shape as dp, filled with -1.
+        Out:
+            * None.
+    """
+
+    # Masks are explored in increasing order, so all subsets of a mask are final when we reach it
+    n = complete_graph.shape[0]
+    dp[1 << source, source] = 0
+    for mask in range(1 << n):
+        for u in range(n):
+            if dp[mask, u] < INF_32:
+                for v in range(n):
+                    if not mask & (1 << v):
+                        new_length = dp[mask, u] + complete_graph[u, v]
+                        if new_length < dp[mask | (1 << v), v]:
+                            dp[mask | (1 << v), v] = new_length
+                            parent[mask | (1 << v), v] = u
+
+#####################################################################################################################################################
+
+@njit(cache=True)
+def _held_karp ( complete_graph: numpy.ndarray,
+                 source:         int,
+                 route:          numpy.ndarray
+               ) ->              int:
+
+    """
+        Solves the TSP with the Held-Karp algorithm, compiled with Numba when available.
+        This is also the function exported by "build_tsp_aot.py" as "tsp_native.solve_tsp".
+        In:
+            * complete_graph: Complete graph of the vertices of interest, as a contiguous int32 matrix.
+            * source:         Vertex used to start the search.
+            * route:          Array of size n in which the best route is written.
+        Out:
+            * best_length: Length of the best route.
+    """
+
+    # Tables of best lengths and predecessors, indexed by (visited vertices, last vertex)
+    n = complete_graph.shape[0]
+    dp = numpy.full((1 << n, n), INF_32, dtype=numpy.int32)
+    parent = numpy.full((1 << n, n), -1, dtype=numpy.int32)
+    _held_karp_tables(complete_graph, source, dp, parent)
+
+    # The route can end on any vertex once all of them are visited
+    mask = (1 << n) - 1
+    vertex = numpy.argmin(dp[mask])
+    best_length = dp[mask, vertex]
+
+    # Follow the predecessors back to the source
+    for i in range(n - 1, -1, -1):
+        route[i] = vertex
+        vertex, mask = parent[mask, vertex], mask ^ (1 << vertex)
+    return best_length
+
+#####################################################################################################################################################
+
+def tsp_held_karp ( complete_graph: numpy.ndarray,
+                    source:         int
+                  ) ->              Tuple[List[int], int]:
+
+    """
+        Function to solve the TSP using the Held-Karp dynamic programming algorithm.
+        Entry (mask, u) of the table is the length of the shortest path from the source that visits the vertices in the bitmask mask and ends in u.
+        This needs O(n^2 * 2^n) operations, instead of the O(n!) of the exhaustive search.
+        In:
+            * complete_graph: Complete graph of the vertices of interest.
+            * source:         Vertex used to start the search.
+        Out:
+            * best_route:  Best route found in the search.
+            * best_length: Length of the best route found.
+    """
+
+    # Use the version compiled ahead of time if available
+    complete_graph = numpy.ascontiguousarray(complete_graph, dtype=numpy.int32)
+    best_route = numpy.empty(complete_graph.shape[0], dtype=numpy.int32)
+    solve = _held_karp if tsp_native is None else tsp_native.solve_tsp
+    best_length = solve(complete_graph, source, best_route)
+    return best_route.tolist(), int(best_length)
+
+# Compile once at import so that the first preprocessing does not pay for it, unless it is already compiled ahead of time
+tsp_held_karp(numpy.zeros((2, 2), dtype=numpy.int32), 0)
+
+#####################################################################################################################################################
+
 def expand_route ( route_in_complete_graph: List[int],
-                   routing_tables:          Dict[int, Dict[int, Union[None, int]]],
+                   routing_tables:          numpy.ndarray,
+                   cell_names:              List[int]
                  ) ->                       List[int]:
     
     """
@@ -131,6 +361,7 @@ def expand_route ( route_in_complete_graph: List[int],
         In:
             * route_in_complete_graph: List of locations in the complete graph.
             * routing_tables:          Routing tables obtained when building the complete graph.
+            * cell_names:              List of cells in the graph that were used to build the complete graph.
         Out:
             * route: Route in the original graph corresponding to the given one.
     """
@@ -141,10 +372,14 @@ def expand_route ( route_in_complete_graph: List[int],
     # retrieve the corresponding sub-route in the original graph and append it to the expanded route.
     for i in range(len(route_in_complete_graph) - 1):
 
-        # Append the found sub-route to the expanded route.
-        route += find_route(routing_tables[route_in_complete_graph[i]], route_in_complete_graph[i], route_in_complete_graph[i + 1])
+        # Append the found sub-route to the expanded route, and remove its last cell which starts the next sub-route.
+        source = cell_names[route_in_complete_graph[i]]
+        target = cell_names[route_in_complete_graph[i + 1]]
+        route.extend(find_route(routing_tables[route_in_complete_graph[i]], source, target))
+        route.pop()
     
-    # Return the expanded route in the original graph.
+    # Add the final cell and return the expanded route in the original graph.
+    route.append(cell_names[route_in_complete_graph[-1]])
     return route
         
 #####################################################################################################################################################
@@ -182,15 +417,16 @@ def preprocessing ( maze:             Union[numpy.ndarray, Dict[int, Dict[int, i
     """
 
     player_pos = player_locations[name]
+    locations_of_interest = [player_pos] + cheese
 
     # We create a complete graph of the cheeses and the initial position in our maze
-    complete_graph, routing_tables = graph_to_metagraph(maze, [player_pos] + cheese)
+    complete_graph, routing_tables = graph_to_metagraph(maze, locations_of_interest)
 
-    # We apply the tsp to the complete graph to get the shortest route
-    best_route, best_length = tsp(complete_graph, player_pos, 0, [], threading.local())
+    # We apply the tsp to the complete graph to get the shortest route, vertex 0 being the initial position
+    best_route, best_length = tsp_held_karp(complete_graph, 0)
 
     # We turn this best route in the complete graph in an actual route in the graph
-    route = expand_route(best_route, routing_tables)
+    route = expand_route(best_route, routing_tables, locations_of_interest)
 
     # We turn this route into actions and store them in the memory
     memory.actions = locations_to_actions(route, maze_width)
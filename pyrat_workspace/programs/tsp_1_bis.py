@@ -22,64 +22,259 @@ from pyrat import *
 
 # External imports 
 import random
+import collections
+import heapq
+import hashlib
+import os
+import tempfile
+import zipfile
+import time
+import numpy
+import scipy.sparse
+import scipy.sparse.csgraph
+
+# Numba is optional, without it the Held-Karp tables are filled with NumPy operations
+try:
+    from numba import njit
+    numba_available = True
+except ImportError:
+    def njit (*args, **kwargs):
+        return lambda function: function
+    numba_available = False
 
 # Previously developed functions
-from tutorial import get_neighbors, locations_to_action
-from dijkstra import dijkstra, locations_to_actions, find_route
+from tutorial import locations_to_action
+from dijkstra import locations_to_actions
 
 #####################################################################################################################################################
 ############################################################### CONSTANTS & VARIABLES ###############################################################
 #####################################################################################################################################################
 
-# [TODO] It is good practice to keep all your constants and global variables in an easily identifiable section
+# Integer used as infinity in the Held-Karp tables, half of the largest int32 so that adding a distance cannot overflow
+INF = numpy.iinfo(numpy.int32).max // 2
+
+# Below this number of vertices, the exhaustive search is faster than filling the Held-Karp tables
+HELD_KARP_MIN_VERTICES = 4
+
+# Above this number of vertices, the Held-Karp tables take too much memory, and the best-first search is used instead, starting from a 2-opt route
+HELD_KARP_MAX_VERTICES = 16
+
+# Time in seconds after which the best-first search stops and returns a heuristic route, well below the 3 seconds PyRat gives to preprocessing by default
+# Extending a partial route computes up to one spanning tree per vertex, so a number of expansions would give very different durations from one maze to another
+BEST_FIRST_TIME_LIMIT = 1.0
+
+# Directory where complete graphs are saved, to reuse them in later games on the same maze with the same vertices of interest
+# The cache is disabled by default, as this program should not write files outside of the game unless asked to, set it to a directory to enable it
+METAGRAPH_CACHE_DIRECTORY = None
+
+# Version of the files in that directory, part of their names, to be increased when their content changes
+METAGRAPH_CACHE_VERSION = 1
+
+# Maximum number of files in that directory, the least recently used ones being removed first
+METAGRAPH_CACHE_MAX_FILES = 256
 
 #####################################################################################################################################################
 ##################################################################### FUNCTIONS #####################################################################
 #####################################################################################################################################################
 
-def graph_to_metagraph ( graph : Union[numpy.ndarray, Dict[int, Dict[int, int]]],
+def graph_to_sparse ( graph : Union[numpy.ndarray, Dict[int, Dict[int, int]]],
+                      vertices: List[int]
+                    ) -> scipy.sparse.csr_matrix :
+    """
+        Function to convert a graph into a sparse matrix, cells being indexed by their number.
+        In:
+            * graph:    Graph to convert.
+            * vertices: Vertices of interest, that must be in the matrix even if they have no neighbors.
+        Out:
+            * sparse_graph: Sparse matrix of the graph, in compressed sparse row format.
+    """
+    if isinstance(graph, numpy.ndarray):
+        return scipy.sparse.csr_matrix(graph)
+    rows = [vertex_1 for vertex_1 in graph for vertex_2 in graph[vertex_1]]
+    columns = [vertex_2 for vertex_1 in graph for vertex_2 in graph[vertex_1]]
+    weights = [graph[vertex_1][vertex_2] for vertex_1 in graph for vertex_2 in graph[vertex_1]]
+    size = max(max(graph), max(vertices)) + 1
+    return scipy.sparse.csr_matrix((weights, (rows, columns)), shape=(size, size))
+
+#####################################################################################################################################################
+
+@njit(cache=True)
+def _bfs_tables ( indptr:       numpy.ndarray,
+                  indices:      numpy.ndarray,
+                  sources:      numpy.ndarray,
+                  distances:    numpy.ndarray,
+                  predecessors: numpy.ndarray
+                ) ->            None:
+    """
+        Fills the distances and predecessors from each source with a breadth-first search, compiled with Numba.
+        This is only valid when all edges have weight 1, in which case no priority queue is needed.
+        In:
+            * indptr:       Row pointers of the sparse matrix of the graph.
+            * indices:      Column indices of the sparse matrix of the graph.
+            * sources:      Vertices from which to start the searches.
+            * distances:    Matrix with one row per source, filled with INF.
+            * predecessors: Matrix with one row per source, filled with -1.
+        Out:
+            * None.
+    """
+    queue = numpy.empty(indptr.shape[0] - 1, dtype=numpy.int32)
+    for i in range(sources.shape[0]):
+
+        # The queue is a preallocated array, as each vertex enters it at most once
+        source = sources[i]
+        distances[i, source] = 0
+        queue[0] = source
+        head, tail = 0, 1
+        while head < tail:
+            vertex = queue[head]
+            head += 1
+            for k in range(indptr[vertex], indptr[vertex + 1]):
+                neighbor = indices[k]
+                if distances[i, neighbor] == INF:
+                    distances[i, neighbor] = distances[i, vertex] + 1
+                    predecessors[i, neighbor] = vertex
+                    queue[tail] = neighbor
+                    tail += 1
+
+# Compile once at import, on a graph of two vertices with the index types of the sparse matrices built by "graph_to_sparse"
+if numba_available:
+    _warm_up_graph = scipy.sparse.csr_matrix(numpy.array([[0, 1], [1, 0]]))
+    _bfs_tables(_warm_up_graph.indptr, _warm_up_graph.indices, numpy.array([0], dtype=numpy.int32), numpy.full((1, 2), INF, dtype=numpy.int32), numpy.full((1, 2), -1, dtype=numpy.int32))
+    del _warm_up_graph
+
+#####################################################################################################################################################
+
+def graph_to_metagraph ( graph : Union[numpy.ndarray, Dict[int, Dict[int, int]], scipy.sparse.csr_matrix],
                          vertices: List[int]
-                        ) -> Tuple[numpy.ndarray, Dict[int, Union[None, int]]] :
+                        ) -> Tuple[numpy.ndarray, Dict[int, int], Dict[int, Dict[int, Union[None, int]]]] :
     """
         Function to build a complete graph out of locations of interest in a given graph.
         In:
-            * graph:    Graph containing the vertices of interest.
+            * graph:    Graph containing the vertices of interest, possibly already converted with "graph_to_sparse".
             * vertices: Vertices to use in the complete graph.
         Out:
-            * complete_graph: Complete graph of the vertices of interest.
-            * routing_tables: Dictionary of routing tables obtained by traversals used to build the complete graph.
+            * complete_graph: Complete graph of the vertices of interest, as a matrix where index i is vertices[i].
+            * index_of:       Dictionary giving the index in the complete graph of each vertex of interest.
+            * routing_tables: Dictionary of routing tables obtained by traversals used to build the complete graph, as arrays of predecessors with -1 for vertices without one.
     """
     n = len(vertices)
 
-    # Initialize with zeros the new complete graph
-    complete_graph = {}
+    # The complete graph is a dense matrix
+    complete_graph = numpy.empty((n, n), dtype=numpy.int32)
+    index_of = {vertex: i for i, vertex in enumerate(vertices)}
 
     # To store the routing tables
     routing_tables = {}
 
-    for vertex_1 in vertices :
+    # Build a sparse matrix of the maze, if not given already
+    sparse_graph = graph if scipy.sparse.issparse(graph) else graph_to_sparse(graph, vertices)
+
+    # Without mud, all edges have weight 1 and a breadth-first search is enough
+    if numba_available and sparse_graph.nnz > 0 and numpy.all(sparse_graph.data == 1):
+        distances = numpy.full((n, sparse_graph.shape[0]), INF, dtype=numpy.int32)
+        predecessors = numpy.full((n, sparse_graph.shape[0]), -1, dtype=numpy.int32)
+        _bfs_tables(sparse_graph.indptr, sparse_graph.indices, numpy.array(vertices, dtype=numpy.int32), distances, predecessors)
 
-        # Perform Dijktra's algorithm starting from vertex1 to get 
-        distances, routing_table = dijkstra(vertex_1, graph)
+    # Otherwise, perform Dijkstra's algorithm from all vertices of interest at once, vertices without a predecessor being marked with -1
+    else:
+        distances, predecessors = scipy.sparse.csgraph.dijkstra(sparse_graph, indices=vertices, return_predecessors=True)
+        predecessors = numpy.ascontiguousarray(predecessors, dtype=numpy.int32)
+        predecessors[predecessors < 0] = -1
 
-        # Store the routing table for vertex_1
-        routing_tables[vertex_1] = routing_table
+    # Fill the complete graph with the distances between vertices of interest, unreachable ones being at distance INF
+    complete_graph[:] = numpy.minimum(distances[:, vertices], INF)
 
-        for vertex_2 in vertices :
+    # The routing table of each vertex of interest is its row in the single matrix of predecessors
+    for i, vertex_1 in enumerate(vertices):
+        routing_tables[vertex_1] = predecessors[i]
 
-            if vertex_2 != vertex_1  :
+    return complete_graph, index_of, routing_tables
+    
 
-                if vertex_1 not in complete_graph:
+#####################################################################################################################################################
+
+def _prune_metagraph_cache ( cache_directory: str
+                           ) -> None:
+    """
+        Removes the least recently used files of the cache directory, so that at most METAGRAPH_CACHE_MAX_FILES remain.
+        Temporary files left by games that were stopped while writing are also removed after an hour.
+        Files being removed by another game at the same time are ignored.
+        In:
+            * cache_directory: Directory where complete graphs are saved.
+        Out:
+            * None.
+    """
+    file_names = []
+    to_remove = []
+    for entry in os.scandir(cache_directory):
+        try:
+            if entry.name.endswith(".npz"):
+                file_names.append((entry.stat().st_mtime, entry.path))
+            elif entry.name.endswith(".tmp") and entry.stat().st_mtime < time.time() - 3600:
+                to_remove.append(entry.path)
+        except OSError:
+            pass
+    to_remove += [file_name for _, file_name in sorted(file_names)[:max(0, len(file_names) - METAGRAPH_CACHE_MAX_FILES)]]
+    for file_name in to_remove:
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
 
-                    complete_graph[vertex_1] = {vertex_2: distances[vertex_2]}
+#####################################################################################################################################################
 
-                else :
+def cached_graph_to_metagraph ( graph : Union[numpy.ndarray, Dict[int, Dict[int, int]]],
+                                vertices: List[int],
+                                cache_directory: str
+                              ) -> Tuple[numpy.ndarray, Dict[int, int], Dict[int, Dict[int, Union[None, int]]]] :
+    """
+        Same as "graph_to_metagraph", but results are saved on disk and loaded when called again with the same graph and vertices.
+        The file name is a hash of the graph and of the vertices in order, as the order gives the indices in the complete graph.
+        In:
+            * graph:    Graph containing the vertices of interest.
+            * vertices: Vertices to use in the complete graph.
+            * cache_directory: Directory where complete graphs are saved, created if needed.
+        Out:
+            * complete_graph: Complete graph of the vertices of interest, as a matrix where index i is vertices[i].
+            * index_of:       Dictionary giving the index in the complete graph of each vertex of interest.
+            * routing_tables: Dictionary of routing tables obtained by traversals used to build the complete graph, as arrays of predecessors with -1 for vertices without one.
+    """
 
-                    # Fill the complete graph with the distances from vertex_1 to vertex_2
-                    complete_graph[vertex_1][vertex_2] = distances[vertex_2]
+    # Hash the version of the files, the sparse matrix of the graph and the vertices
+    sparse_graph = graph_to_sparse(graph, vertices)
+    sparse_graph.sort_indices()
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(b"metagraph-v%d" % METAGRAPH_CACHE_VERSION)
+    for array in (numpy.array(sparse_graph.shape), sparse_graph.indptr, sparse_graph.indices, sparse_graph.data, numpy.array(vertices)):
+        hasher.update(numpy.ascontiguousarray(array, dtype=numpy.int64).tobytes())
+    file_name = os.path.join(cache_directory, hasher.hexdigest() + ".npz")
 
-    return complete_graph, routing_tables
-    
+    # Load the results if they exist, a file that cannot be read being treated as missing
+    n = len(vertices)
+    try:
+        with numpy.load(file_name) as data:
+            complete_graph, predecessors = data["complete_graph"], numpy.ascontiguousarray(data["predecessors"], dtype=numpy.int32)
+        if complete_graph.shape == (n, n) and predecessors.shape == (n, sparse_graph.shape[0]):
+            os.utime(file_name)
+            return complete_graph, {vertex: i for i, vertex in enumerate(vertices)}, {vertex: predecessors[i] for i, vertex in enumerate(vertices)}
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        pass
+
+    # Otherwise, compute them and save them for later, the game not needing this to succeed
+    # The file is written under a temporary name and then renamed, so that other games never see it partially written
+    complete_graph, index_of, routing_tables = graph_to_metagraph(sparse_graph, vertices)
+    temporary_file_name = None
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_directory, suffix=".tmp", delete=False) as temporary_file:
+            temporary_file_name = temporary_file.name
+            numpy.savez_compressed(temporary_file, complete_graph=complete_graph, predecessors=numpy.stack([routing_tables[vertex] for vertex in vertices]))
+        os.replace(temporary_file_name, file_name)
+        _prune_metagraph_cache(cache_directory)
+    except OSError:
+        if temporary_file_name is not None and os.path.exists(temporary_file_name):
+            os.remove(temporary_file_name)
+    return complete_graph, index_of, routing_tables
 
 #####################################################################################################################################################
 
@@ -126,11 +321,12 @@ def dfs_recursive ( source: int,
 
 #####################################################################################################################################################
 
-def tsp ( complete_graph: numpy.ndarray,
-          source:         int
-        ) ->              Tuple[List[int], int]:
+def tsp_exhaustive ( complete_graph: numpy.ndarray,
+                     source:         int
+                   ) ->              Tuple[List[int], int]:
     """
         Function to solve the TSP using an exhaustive search.
+        Routes from the same vertex through the same remaining vertices have the same best completion, so it is computed once.
         In:
             * complete_graph: Complete graph of the vertices of interest.
             * source:         Vertex used to start the search.
@@ -139,69 +335,349 @@ def tsp ( complete_graph: numpy.ndarray,
             * best_length: Length of the best route found.
     """
     n = len(complete_graph)
-    
-    # Initialize variables to store the best route and its length
-    best_route = []
-    best_length = float('inf')
-    
-    # Define a recursive function for the brute-force search
-    def brute_force(graph, vertex, path, weight):
+
+    # Best lengths already computed, each state (vertex, remaining_mask) being packed in a single integer key
+    cache = {}
+    vertex_bits = n.bit_length()
+
+    # Python integers in nested lists are faster to read one at a time than matrix elements
+    distances = complete_graph.tolist() if isinstance(complete_graph, numpy.ndarray) else complete_graph
+
+    # Define a memoized recursive function for the brute-force search
+    def cost(vertex, remaining_mask):
         """
-        Recursive helper function to explore all possible routes.
+        Recursive helper function to explore all possible routes, each state being explored only once.
 
         Args:
-            * graph (dict): The complete graph.
             * vertex (int): The current vertex.
-            * path (list): The route taken so far.
-            * weight (int): The length of the route so far.
+            * remaining_mask (int): The vertices left to visit, vertex v being left if bit v is set.
+
+        Returns:
+            * length (int): The length of the best route from the current vertex visiting all remaining vertices.
         """
-        nonlocal best_length, best_route
+        if remaining_mask == 0:
+            return 0
+        key = (remaining_mask << vertex_bits) | vertex
+        length = cache.get(key)
+        if length is None:
+            length = min(distances[vertex][neighbor] + cost(neighbor, remaining_mask & ~(1 << neighbor)) for neighbor in range(n) if remaining_mask & (1 << neighbor))
+            cache[key] = length
+        return length
 
-        if len(path) == len(graph) :
+    # Start the brute-force search from the source vertex
+    remaining_mask = ((1 << n) - 1) & ~(1 << source)
+    best_length = int(cost(source, remaining_mask))
 
-            if weight < best_length:
+    # Replay the choices, the best next vertex being the one that gives the cached cost
+    best_route = [source]
+    while remaining_mask != 0:
+        vertex = best_route[-1]
+        best_route.append(min((neighbor for neighbor in range(n) if remaining_mask & (1 << neighbor)), key=lambda neighbor: distances[vertex][neighbor] + cost(neighbor, remaining_mask & ~(1 << neighbor))))
+        remaining_mask &= ~(1 << best_route[-1])
 
-                best_length = weight
-                best_route = path
+    return best_route, best_length
 
-            return
-        
-        for neighbor in get_neighbors(vertex, graph) :
-            
-            if neighbor not in path :
-                
-                brute_force(graph, neighbor, path + [neighbor], weight + graph[vertex][neighbor])
-    
-    # Start the brute-force search from the source vertex
-    brute_force(complete_graph, source, [source], 0)
+#####################################################################################################################################################
+
+def tsp_best_first ( complete_graph: numpy.ndarray,
+                     source:         int,
+                     time_limit:     float = BEST_FIRST_TIME_LIMIT
+                   ) ->              Tuple[List[int], int]:
+    """
+        Function to solve the TSP using a best-first search (A*) among partial routes.
+        The priority of a partial route is its length plus the length of a minimum spanning tree of its last vertex and the vertices left to visit.
+        Any route visiting them is such a spanning tree, so this never overestimates, and the first complete route taken from the queue is the best one.
+        The route of "tsp_2_opt" is computed first, and partial routes that cannot beat it are not queued.
+        If the search takes too long, it stops and returns that route, which may then not be the best one.
+        In:
+            * complete_graph: Complete graph of the vertices of interest.
+            * source:         Vertex used to start the search.
+            * time_limit:     Time in seconds after which the route of "tsp_2_opt" is returned.
+        Out:
+            * best_route:  Best route found in the search.
+            * best_length: Length of the best route found.
+    """
+    n = len(complete_graph)
+    full_mask = (1 << n) - 1
+    distances = numpy.minimum(complete_graph, INF)
+
+    # Lower bounds only depend on the vertices to span, so they are computed once per set
+    # SciPy reads zeros as missing edges, so all distances are increased by 1 and the k - 1 edges of the tree are removed from its length
+    mst_lengths = {}
+    shifted_distances = distances.astype(numpy.int64) + 1
+    numpy.fill_diagonal(shifted_distances, 0)
+    def lower_bound(vertex, visited_mask):
+        remaining_mask = (full_mask ^ visited_mask) | (1 << vertex)
+        if remaining_mask not in mst_lengths:
+            remaining = [v for v in range(n) if remaining_mask & (1 << v)]
+            mst_lengths[remaining_mask] = int(scipy.sparse.csgraph.minimum_spanning_tree(shifted_distances[numpy.ix_(remaining, remaining)]).sum()) - (len(remaining) - 1)
+        return mst_lengths[remaining_mask]
+
+    # The heuristic route is returned if nothing better is found
+    deadline = time.perf_counter() + time_limit
+    heuristic_route, heuristic_length = tsp_2_opt(complete_graph, source)
+
+    # Queue of partial routes, ordered by priority, then by length
+    queue = [(lower_bound(source, 1 << source), 0, source, 1 << source, (source,))]
+    best_lengths = {(source, 1 << source): 0}
+    while queue:
+        priority, length, vertex, visited_mask, route = heapq.heappop(queue)
+
+        # The first complete route is the best one
+        if visited_mask == full_mask:
+            return list(route), length
+
+        # Skip the routes that reached the same state with a larger length
+        if length > best_lengths[(vertex, visited_mask)]:
+            continue
+
+        # Stop when the time is up
+        if time.perf_counter() > deadline:
+            break
+
+        # Extend the route with each unvisited vertex, closest first, unless it cannot beat the heuristic route
+        for neighbor in sorted((v for v in range(n) if not visited_mask & (1 << v)), key=lambda v: distances[vertex, v]):
+            new_length = length + int(distances[vertex, neighbor])
+            new_mask = visited_mask | (1 << neighbor)
+            if new_length < best_lengths.get((neighbor, new_mask), INF):
+                best_lengths[(neighbor, new_mask)] = new_length
+                new_priority = new_length + lower_bound(neighbor, new_mask)
+                if new_priority < heuristic_length:
+                    heapq.heappush(queue, (new_priority, new_length, neighbor, new_mask, route + (neighbor,)))
+
+    # If no route better than the heuristic one was found, or the time is up, we return the heuristic route
+    return heuristic_route, heuristic_length
+
+#####################################################################################################################################################
+
+def tsp_2_opt ( complete_graph: numpy.ndarray,
+                source:         int
+              ) ->              Tuple[List[int], int]:
+    """
+        Function to approximate the TSP with a 2-opt local search, starting from the nearest neighbor route.
+        A 2-opt move reverses a segment of the route, which replaces two of its edges by two others, and is applied while one shortens the route.
+        The route found is not always the best one, but it is usually close on maze distances, and each pass only needs O(n^2) operations.
+        In:
+            * complete_graph: Complete graph of the vertices of interest.
+            * source:         Vertex used to start the search.
+        Out:
+            * best_route:  Best route found in the search.
+            * best_length: Length of the best route found.
+    """
+    n = len(complete_graph)
+
+    # Start from the route that always goes to the closest unvisited vertex
+    route = [source]
+    unvisited = numpy.ones(n, dtype=bool)
+    unvisited[source] = False
+    for _ in range(n - 1):
+        vertex = int(numpy.argmin(numpy.where(unvisited, complete_graph[route[-1]], INF)))
+        route.append(vertex)
+        unvisited[vertex] = False
+
+    # The route ends with a dummy vertex at distance 0 from all others, so that segments at the end of the route need no special case
+    distances = numpy.zeros((n + 1, n + 1), dtype=numpy.int64)
+    distances[:n, :n] = numpy.minimum(complete_graph, INF)
+    route = numpy.array(route + [n])
+
+    # For each start of segment, reverse the segment that shortens the route the most, until no reversal does
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            ends = numpy.arange(i + 1, n)
+            gains = distances[route[i - 1], route[i]] + distances[route[ends], route[ends + 1]] - distances[route[i - 1], route[ends]] - distances[route[i], route[ends + 1]]
+            best = int(numpy.argmax(gains))
+            if gains[best] > 0:
+                route[i:ends[best] + 1] = route[i:ends[best] + 1][::-1].copy()
+                improved = True
+
+    # Remove the dummy vertex
+    best_route = route[:n].tolist()
+    best_length = int(sum(distances[best_route[i], best_route[i + 1]] for i in range(n - 1)))
     return best_route, best_length
 
+#####################################################################################################################################################
+
+@njit(cache=True)
+def _held_karp_tables ( distances: numpy.ndarray,
+                        source:    int,
+                        dp:        numpy.ndarray,
+                        parent:    numpy.ndarray
+                      ) ->         None:
+    """
+        Fills the tables of the Held-Karp algorithm with plain loops, compiled with Numba.
+        In:
+            * distances: Complete graph of the vertices of interest, as an int32 matrix.
+            * source:    Vertex used to start the search.
+            * dp:        Table of best lengths indexed by (visited vertices, last vertex), filled with INF except for the source.
+            * parent:    Table of predecessors with the same shape as dp, filled with -1.
+        Out:
+            * None.
+    """
+    n = distances.shape[0]
+
+    # Masks are explored in increasing order, so all subsets of a mask are final when we reach it
+    for mask in range(1 << n):
+        for u in range(n):
+            if dp[mask, u] < INF:
+                for v in range(n):
+                    if not mask & (1 << v):
+                        new_length = dp[mask, u] + distances[u, v]
+                        if new_length < dp[mask | (1 << v), v]:
+                            dp[mask | (1 << v), v] = new_length
+                            parent[mask | (1 << v), v] = u
+
+#####################################################################################################################################################
+
+def tsp ( complete_graph: numpy.ndarray,
+          source:         int
+        ) ->              Tuple[List[int], int]:
+    """
+        Function to solve the TSP using the Held-Karp dynamic programming algorithm.
+        Vertices are the indices of the complete graph, as built by "graph_to_metagraph".
+        Entry (mask, u) of the table is the length of the shortest path from the source that visits the vertices in the bitmask mask and ends in u.
+        This needs O(n^2 * 2^n) operations, instead of the O(n!) of the exhaustive search, which is only used for very small graphs.
+        As the tables also need O(n * 2^n) memory, large graphs are solved with "tsp_best_first", which returns the route of "tsp_2_opt" if it takes too long.
+        In:
+            * complete_graph: Complete graph of the vertices of interest.
+            * source:         Vertex used to start the search.
+        Out:
+            * best_route:  Best route found in the search.
+            * best_length: Length of the best route found.
+    """
+    n = len(complete_graph)
+
+    # Small graphs are solved directly, and large ones with a search that does not need a table for all sets of vertices
+    if n < HELD_KARP_MIN_VERTICES:
+        return tsp_exhaustive(complete_graph, source)
+    if n > HELD_KARP_MAX_VERTICES:
+        return tsp_best_first(complete_graph, source)
+
+    # Tables of best lengths and predecessors, indexed by (visited vertices, last vertex)
+    distances = numpy.minimum(complete_graph, INF).astype(numpy.int32)
+    dp = numpy.full((1 << n, n), INF, dtype=numpy.int32)
+    parent = numpy.full((1 << n, n), -1, dtype=numpy.int8)
+    dp[1 << source, source] = 0
+    bits = 1 << numpy.arange(n)
+
+    # Masks are explored in increasing order, so all subsets of a mask are final when we reach it
+    if numba_available:
+        _held_karp_tables(distances, source, dp, parent)
+    else:
+        for mask in range(1, 1 << n):
+            unvisited = numpy.flatnonzero((mask & bits) == 0)
+            if len(unvisited) == 0:
+                continue
+            next_masks = mask | bits[unvisited]
+
+            # Extend the paths ending in all vertices u with all unvisited vertices v at once, as a min-plus product of the row of the mask with the distances
+            new_lengths = dp[mask, :, None] + distances[:, unvisited]
+            best_u = new_lengths.argmin(axis=0)
+            new_lengths = new_lengths[best_u, numpy.arange(len(unvisited))]
+            better = new_lengths < dp[next_masks, unvisited]
+            dp[next_masks[better], unvisited[better]] = new_lengths[better]
+            parent[next_masks[better], unvisited[better]] = best_u[better]
+
+    # The route can end on any vertex once all of them are visited
+    mask = (1 << n) - 1
+    vertex = int(numpy.argmin(dp[mask]))
+    best_length = int(dp[mask, vertex])
+
+    # Follow the predecessors back to the source
+    best_route = []
+    while vertex != -1:
+        best_route.append(vertex)
+        vertex, mask = int(parent[mask, vertex]), mask ^ (1 << vertex)
+    return best_route[::-1], best_length
+
+# Compile once at import so that the first preprocessing does not pay for it
+tsp(numpy.ones((HELD_KARP_MIN_VERTICES, HELD_KARP_MIN_VERTICES), dtype=numpy.int32), 0)
+
+#####################################################################################################################################################
+
+@njit(cache=True)
+def _walk_predecessors ( routing_table: numpy.ndarray,
+                         source:        int,
+                         target:        int,
+                         route:         numpy.ndarray,
+                         position:      int
+                       ) ->             int:
+    """
+        Writes the cells from the source (excluded) to the target (included) backwards in the route, compiled with Numba.
+        In:
+            * routing_table: Array of predecessors of the source, with -1 for vertices without one.
+            * source:        Vertex from which the route starts.
+            * target:        Vertex at which the route ends.
+            * route:         Array in which to write the cells.
+            * position:      Index at which to write the target, previous cells being written before it.
+        Out:
+            * position: Index before the first cell written, or -1 if the target is not reachable from the source.
+    """
+    current_vertex = target
+    while current_vertex != source:
+        if current_vertex == -1:
+            return -1
+        route[position] = current_vertex
+        position -= 1
+        current_vertex = routing_table[current_vertex]
+    return position
+
+# Compile once at import, as for the search above, with the types used by "expand_route"
+_walk_predecessors(numpy.array([1, -1], dtype=numpy.int32), 1, 0, numpy.empty(2, dtype=numpy.int32), 1)
 
 #####################################################################################################################################################
 
 def expand_route (  route_in_complete_graph: List[int], 
-                    routing_tables: Dict[int, Dict[int, Union[None, int]]], 
-                    cell_names: List[int]
+                    routing_tables: Dict[int, numpy.ndarray], 
+                    cell_names: List[int],
+                    complete_graph: Optional[numpy.ndarray] = None
                 ) -> List[int]:
     """
     Returns the route in the original graph corresponding to a route in the complete graph.
+    The route is written in a single preallocated array, cells joining two segments appearing once.
     
     Args:
-        route_in_complete_graph: List of locations in the complete graph.
-        routing_tables: Routing tables obtained when building the complete graph.
+        route_in_complete_graph: List of indices in the complete graph.
+        routing_tables: Routing tables obtained when building the complete graph, as arrays of predecessors.
         cell_names: List of cells in the graph that were used to build the complete graph.
+        complete_graph: Complete graph of the vertices of interest, used to bound the number of cells of each segment.
+            If not given, each segment reserves as many cells as the maze, which is correct but uses more memory.
 
     Returns:
         route: Route in the original graph corresponding to the given one.
     """
     
-    route = []
-
-    for i in range(len(route_in_complete_graph) - 1):
+    if len(route_in_complete_graph) == 0:
+        return []
+
+    # A segment has at most as many moves as its length, as all weights are at least 1, and at most as many as cells in the maze
+    segments = list(zip(route_in_complete_graph, route_in_complete_graph[1:]))
+    nb_cells = len(routing_tables[cell_names[route_in_complete_graph[0]]])
+    bounds = [nb_cells] * len(segments)
+    if complete_graph is not None:
+        for k, (i, j) in enumerate(segments):
+            if complete_graph[i, j] >= INF:
+                raise ValueError(f"Cell {cell_names[j]} is not reachable from cell {cell_names[i]}.")
+            bounds[k] = min(int(complete_graph[i, j]), nb_cells)
+    route = numpy.empty(sum(bounds) + 1, dtype=numpy.int32)
+    route[0] = cell_names[route_in_complete_graph[0]]
+    end = 0
+
+    for (i, j), bound in zip(segments, bounds):
         
-        route += find_route(routing_tables[route_in_complete_graph[i]], route_in_complete_graph[i], route_in_complete_graph[i + 1])
+        # Walk the predecessors from the target, filling the space reserved for the segment from its end
+        source, target = cell_names[i], cell_names[j]
+        position = _walk_predecessors(routing_tables[source], source, target, route, end + bound)
+        if position == -1:
+            raise ValueError("The target is not reachable from the source.")
+
+        # Move the segment right after the previous one
+        length = end + bound - position
+        route[end + 1:end + 1 + length] = route[position + 1:end + bound + 1]
+        end += length
 
-    return route
+    return route[:end + 1].tolist()
 
 
     
@@ -242,14 +718,18 @@ def preprocessing ( maze:             Union[numpy.ndarray, Dict[int, Dict[int, i
     current_position = player_locations[name]
     vertices_of_interest = [current_position] + cheese
 
-    # Build the complete graph and routing tables using graph_to_metagraph function
-    complete_graph, routing_tables = graph_to_metagraph(maze, vertices_of_interest)
+    # Build the complete graph and routing tables using graph_to_metagraph function, unless it was already done in a previous game with the cache enabled
+    if METAGRAPH_CACHE_DIRECTORY is None:
+        complete_graph, index_of, routing_tables = graph_to_metagraph(maze, vertices_of_interest)
+    else:
+        complete_graph, index_of, routing_tables = cached_graph_to_metagraph(maze, vertices_of_interest, METAGRAPH_CACHE_DIRECTORY)
 
-    best_route, best_length = tsp(complete_graph, current_position)
+    best_route, best_length = tsp(complete_graph, index_of[current_position])
 
-    route = expand_route(best_route, routing_tables, vertices_of_interest)
+    route = expand_route(best_route, routing_tables, vertices_of_interest, complete_graph)
 
-    memory.actions = locations_to_actions(route, maze_width)
+    # Actions are consumed from the front at each turn, which a deque does in constant time
+    memory.actions = collections.deque(locations_to_actions(route, maze_width))
 
     
 #####################################################################################################################################################
@@ -289,7 +769,7 @@ def turn ( maze:             Union[numpy.ndarray, Dict[int, Dict[int, int]]],
             * action: One of the possible actions, as given in possible_actions.
     """
 
-    action = memory.actions.pop(0)
+    action = memory.actions.popleft()
     return action 
 
 #####################################################################################################################################################
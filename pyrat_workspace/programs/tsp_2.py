@@ -30,6 +30,8 @@ from dijkstra import *
 ############################################################### CONSTANTS & VARIABLES ###############################################################
 #####################################################################################################################################################
 
+# Integer used as infinity for lengths, so that comparisons in the search never mix integers and floats
+INF = 10**18
 
 #####################################################################################################################################################
 ##################################################################### FUNCTIONS #####################################################################
@@ -92,35 +94,43 @@ def tsp ( complete_graph: Dict[int, Dict[int, Union[None, int]]],
             * best_length: Length of the best route found.
     """
 
-    memory.best_route = []
-    memory.best_length = float('inf')
+    # The best route and its length are kept in boxes shared by all calls, instead of attributes of the memory
+    best_route = [[]]
+    best_length = [INF]
+
+    # Visited vertices are stored as a bitmask, each vertex of the complete graph being given its own bit
+    bit_of = {vertex: 1 << i for i, vertex in enumerate(complete_graph)}
+    full_mask = (1 << len(complete_graph)) - 1
     
-    # Internal implementation of the recursive tsp
-    def backtrack (complete_graph, current_vertex, length_current_route, current_route):
+    # Internal implementation of the recursive tsp, all calls extending and shrinking the same route
+    def backtrack (complete_graph, current_vertex, length_current_route, current_route, visited):
         
         # We stop when all vertices are visited
-        if len(current_route) == len(complete_graph) :
+        if visited == full_mask :
 
-            if length_current_route < memory.best_length:
+            if length_current_route < best_length[0]:
             
-                memory.best_route = current_route
-                memory.best_length = length_current_route
+                best_route[0] = current_route.copy()
+                best_length[0] = length_current_route
             
             return
         
         # We stop if the route is already longer than the shortest route
-        if length_current_route >= memory.best_length:
+        if length_current_route >= best_length[0]:
             return
         
         # If there are still vertices to visit, we explore unexplored neighbors
         for neighbor in complete_graph[current_vertex] :
 
-            if neighbor not in current_route :
+            if not visited & bit_of[neighbor] :
                 
-                backtrack(complete_graph, neighbor, length_current_route + complete_graph[current_vertex][neighbor], current_route + [neighbor])
+                current_route.append(neighbor)
+                backtrack(complete_graph, neighbor, length_current_route + complete_graph[current_vertex][neighbor], current_route, visited | bit_of[neighbor])
+                current_route.pop()
                
     # Perform the traversal
-    backtrack(complete_graph, source, 0, [source])
+    backtrack(complete_graph, source, 0, [source], bit_of[source])
+    memory.best_route, memory.best_length = best_route[0], best_length[0]
     return memory.best_route, memory.best_length
 
 #####################################################################################################################################################
@@ -0,0 +1,148 @@
+#####################################################################################################################################################
+######################################################################## INFO #######################################################################
+#####################################################################################################################################################
+
+"""
+    This program contains the unit tests for the functions developed in the program "TSP_3.py".
+    The search is checked against a brute-force enumeration of all routes, on small random complete graphs.
+"""
+
+#####################################################################################################################################################
+###################################################################### IMPORTS ######################################################################
+#####################################################################################################################################################
+
+# Import PyRat
+from pyrat import *
+
+# External imports
+import unittest
+import itertools
+import numpy
+import sys
+import os
+
+# Previously developed functions
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "programs"))
+from TSP_3 import *
+
+#####################################################################################################################################################
+############################################################### UNIT TESTS DEFINITION ###############################################################
+#####################################################################################################################################################
+
+class TestsTSP3 (unittest.TestCase):
+
+    """
+        Here we choose to use the unittest module to perform unit tests.
+        This module is very simple to use and allows to easily check if the code is working as expected.
+    """
+
+    #############################################################################################################################################
+    #                                                               PUBLIC METHODS                                                              #
+    #############################################################################################################################################
+
+    def random_complete_graphs (self):
+
+        """
+            Generates small random symmetric complete graphs, with a random source for each of them.
+            Some off-diagonal distances are 0, as happens when two vertices of interest share a cell.
+            In:
+                * self: Reference to the current object.
+            Out:
+                * graphs: List of pairs (complete_graph, source).
+        """
+
+        rng = numpy.random.default_rng(0)
+        graphs = []
+        for n in list(range(1, 9)) * 4:
+            complete_graph = rng.integers(0, 20, size=(n, n))
+            complete_graph = (complete_graph + complete_graph.T).astype(numpy.int32)
+            numpy.fill_diagonal(complete_graph, 0)
+            graphs.append((complete_graph, int(rng.integers(n))))
+        return graphs
+
+    #############################################################################################################################################
+
+    def brute_force (self, complete_graph, source):
+
+        """
+            Computes the length of the best route by enumerating all of them.
+            In:
+                * self:           Reference to the current object.
+                * complete_graph: Complete graph of the vertices of interest.
+                * source:         Vertex used to start the routes.
+            Out:
+                * best_length: Length of the best route.
+        """
+
+        others = [vertex for vertex in range(len(complete_graph)) if vertex != source]
+        return min(sum(int(complete_graph[u, v]) for u, v in zip((source,) + route, route)) for route in itertools.permutations(others))
+
+    #############################################################################################################################################
+
+    def assert_valid_route (self, complete_graph, source, route, length):
+
+        """
+            Checks that a route starts at the source, visits all vertices once, and has the given length.
+            In:
+                * self:           Reference to the current object.
+                * complete_graph: Complete graph of the vertices of interest.
+                * source:         Vertex used to start the route.
+                * route:          Route to check.
+                * length:         Length announced for the route.
+            Out:
+                * None.
+        """
+
+        self.assertEqual(route[0], source)
+        self.assertEqual(sorted(route), list(range(len(complete_graph))))
+        self.assertEqual(sum(int(complete_graph[u, v]) for u, v in zip(route, route[1:])), length)
+
+    #############################################################################################################################################
+
+    def test_tsp (self):
+
+        """
+            The search, run in parallel threads from each neighbor of the source, finds the same best length as the brute force.
+            In:
+                * self: Reference to the current object.
+            Out:
+                * None.
+        """
+
+        for complete_graph, source in self.random_complete_graphs():
+            route, length = tsp(complete_graph, source)
+            self.assert_valid_route(complete_graph, source, route, length)
+            self.assertEqual(length, self.brute_force(complete_graph, source))
+
+    #############################################################################################################################################
+
+    def test_tsp_pruning_rules (self):
+
+        """
+            Each improvement of the search, and all of them at once, can be disabled without changing the best length found.
+            In:
+                * self: Reference to the current object.
+            Out:
+                * None.
+        """
+
+        rules = ["sort_neighbors", "use_min_in_bound", "use_mst_bound"]
+        for complete_graph, source in self.random_complete_graphs():
+            best_length = self.brute_force(complete_graph, source)
+            for disabled in [[rule] for rule in rules] + [rules]:
+                with self.subTest(n=len(complete_graph), disabled=disabled):
+                    route, length = tsp(complete_graph, source, **{rule: False for rule in disabled})
+                    self.assert_valid_route(complete_graph, source, route, length)
+                    self.assertEqual(length, best_length)
+
+#####################################################################################################################################################
+######################################################################## GO! ########################################################################
+#####################################################################################################################################################
+
+if __name__ == "__main__":
+
+    # Run all unit tests
+    unittest.main(verbosity=2)
+
+#####################################################################################################################################################
+#####################################################################################################################################################
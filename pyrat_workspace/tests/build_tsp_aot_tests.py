@@ -0,0 +1,80 @@
+#####################################################################################################################################################
+######################################################################## INFO #######################################################################
+#####################################################################################################################################################
+
+"""
+    This program contains the unit tests for the module "tsp_native" built by the script "build_tsp_aot.py".
+    The module compiled ahead of time is checked against the Held-Karp function of "tsp_1.py" that it exports.
+    These tests are skipped if the module was not built.
+"""
+
+#####################################################################################################################################################
+###################################################################### IMPORTS ######################################################################
+#####################################################################################################################################################
+
+# Import PyRat
+from pyrat import *
+
+# External imports
+import unittest
+import numpy
+import sys
+import os
+
+# Previously developed functions
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "programs"))
+from tsp_1 import _held_karp
+try:
+    import tsp_native
+except ImportError:
+    tsp_native = None
+
+#####################################################################################################################################################
+############################################################### UNIT TESTS DEFINITION ###############################################################
+#####################################################################################################################################################
+
+@unittest.skipIf(tsp_native is None, "tsp_native is not built, run build_tsp_aot.py to build it")
+class TestsBuildTSPAOT (unittest.TestCase):
+
+    """
+        Here we choose to use the unittest module to perform unit tests.
+        This module is very simple to use and allows to easily check if the code is working as expected.
+    """
+
+    #############################################################################################################################################
+    #                                                               PUBLIC METHODS                                                              #
+    #############################################################################################################################################
+
+    def test_solve_tsp (self):
+
+        """
+            The module compiled ahead of time gives the same length and route as the function compiled at run time, on small random graphs.
+            In:
+                * self: Reference to the current object.
+            Out:
+                * None.
+        """
+
+        rng = numpy.random.default_rng(0)
+        for n in list(range(1, 10)) * 3:
+            complete_graph = rng.integers(0, 20, size=(n, n))
+            complete_graph = (complete_graph + complete_graph.T).astype(numpy.int32)
+            numpy.fill_diagonal(complete_graph, 0)
+            source = int(rng.integers(n))
+            native_route, jit_route = numpy.empty(n, dtype=numpy.int32), numpy.empty(n, dtype=numpy.int32)
+            native_length = tsp_native.solve_tsp(complete_graph, source, native_route)
+            jit_length = _held_karp(complete_graph, source, jit_route)
+            self.assertEqual(native_length, jit_length)
+            self.assertEqual(native_route.tolist(), jit_route.tolist())
+
+#####################################################################################################################################################
+######################################################################## GO! ########################################################################
+#####################################################################################################################################################
+
+if __name__ == "__main__":
+
+    # Run all unit tests
+    unittest.main(verbosity=2)
+
+#####################################################################################################################################################
+#####################################################################################################################################################
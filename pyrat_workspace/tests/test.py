@@ -3,6 +3,7 @@ from pyrat import *
 
 # External imports
 import unittest
+import unittest.mock
 import numpy
 import sys
 import os
@@ -22,17 +23,42 @@ class TestYourProgram(unittest.TestCase):
         self.vertices = [0, 1, 2, 3]
 
     def test_graph_to_metagraph(self):
-        # Test the graph_to_metagraph function
-        complete_graph, routing_tables = graph_to_metagraph(self.maze, self.vertices)
+        # Test the graph_to_metagraph function, on the same maze as a dictionary since Dijkstra's algorithm needs one
+        maze = {i: {j: int(self.maze[i, j]) for j in range(len(self.maze)) if self.maze[i, j]} for i in range(len(self.maze))}
+        complete_graph, routing_tables = graph_to_metagraph(maze, self.vertices)
 
-        # Assert that complete_graph is a dictionary
-        self.assertIsInstance(complete_graph, dict)
+        # Assert that complete_graph is a matrix
+        self.assertIsInstance(complete_graph, numpy.ndarray)
         
-        # Assert that routing_tables is a dictionary
-        self.assertIsInstance(routing_tables, dict)
+        # Assert that routing_tables is a matrix with one row per vertex
+        self.assertIsInstance(routing_tables, numpy.ndarray)
+        self.assertEqual(routing_tables.shape[0], len(self.vertices))
+
+        # The maze is a line, so distances are differences of indices, and each cell is reached from its neighbor closer to the source
+        self.assertTrue(numpy.array_equal(complete_graph, numpy.abs(numpy.subtract.outer(self.vertices, self.vertices))))
+        self.assertEqual(routing_tables[0].tolist(), [-1, 0, 1, 2])
+        self.assertEqual(routing_tables[3].tolist(), [1, 2, 3, -1])
 
         # Add more specific assertions based on your expected output
 
+    def test_graph_to_metagraph_cache(self):
+        # A new game on the same maze gives a different dictionary with the same contents, which should reuse the cached results
+        maze = {i: {j: int(self.maze[i, j]) for j in range(len(self.maze)) if self.maze[i, j]} for i in range(len(self.maze))}
+        complete_graph, routing_tables = graph_to_metagraph(maze, self.vertices)
+        same_maze = {i: dict(neighbors) for i, neighbors in maze.items()}
+        with unittest.mock.patch("tsp_1.parallel_dijkstra", wraps=parallel_dijkstra) as mocked_dijkstra:
+            cached_complete_graph, cached_routing_tables = graph_to_metagraph(same_maze, self.vertices)
+
+        # Assert that no source was searched again, and that the results are unchanged
+        mocked_dijkstra.assert_called_once_with(same_maze, [])
+        self.assertTrue(numpy.array_equal(cached_complete_graph, complete_graph))
+        self.assertTrue(numpy.array_equal(cached_routing_tables, routing_tables))
+
+        # A maze with other weights should not hit the cache
+        other_maze = {i: {j: 2 * weight for j, weight in neighbors.items()} for i, neighbors in maze.items()}
+        other_complete_graph, _ = graph_to_metagraph(other_maze, self.vertices)
+        self.assertTrue(numpy.array_equal(other_complete_graph, 2 * complete_graph))
+
     def test_tsp(self):
         # Test the tsp function
         complete_graph = {0: {1: 1, 2: 2, 3: 3},
@@ -45,17 +71,37 @@ class TestYourProgram(unittest.TestCase):
 
         # Add assertions to check if the best_route and best_length are as expected
 
+    def test_tsp_held_karp(self):
+        # Test the tsp_held_karp function
+        complete_graph = numpy.array([[0, 1, 2, 3],
+                                      [1, 0, 1, 2],
+                                      [2, 1, 0, 1],
+                                      [3, 2, 1, 0]])
+
+        best_route, best_length = tsp_held_karp(complete_graph, 0)
+
+        self.assertEqual(best_route, [0, 1, 2, 3])
+        self.assertEqual(best_length, 3)
+
+        # Starting from the middle, the best route first goes to the closest end
+        best_route, best_length = tsp_held_karp(complete_graph, 1)
+
+        self.assertEqual(best_route, [1, 0, 2, 3])
+        self.assertEqual(best_length, 4)
+
     def test_expand_route(self):
-        # Test the expand_route function
-        route_in_complete_graph = [0, 1, 2, 3]
-        routing_tables = {0: {1: [0, 1], 2: [0, 2], 3: [0, 2, 3]},
-                          1: {0: [1, 0], 2: [1, 2], 3: [1, 2, 3]},
-                          2: {0: [2, 0], 1: [2, 1], 3: [2, 3]},
-                          3: {0: [3, 2, 0], 1: [3, 2, 1], 2: [3, 2]}}
-        
-        expanded_route = expand_route(route_in_complete_graph, routing_tables)
+        # Test the expand_route function, with the routing tables of the line maze from its two ends
+        # Row i gives the predecessor of each cell from cell_names[i], or -1 if none
+        cell_names = [0, 3]
+        routing_tables = numpy.array([[-1, 0, 1, 2],
+                                      [1, 2, 3, -1]], dtype=numpy.int32)
+
+        # Vertices of the complete graph are indices in cell_names, and the route goes through all cells in between
+        self.assertEqual(expand_route([0, 1], routing_tables, cell_names), [0, 1, 2, 3])
+        self.assertEqual(expand_route([1, 0], routing_tables, cell_names), [3, 2, 1, 0])
 
-        # Add assertions to check if the expanded_route is as expected
+        # A route with a single vertex stays on its cell
+        self.assertEqual(expand_route([1], routing_tables, cell_names), [3])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -37,6 +37,8 @@ from pyrat import *
 
 # External imports
 import unittest
+import unittest.mock
+import tempfile
 import numpy
 import sys
 import os
@@ -142,7 +144,7 @@ class TestsTutorial (unittest.TestCase):
         """Test the graph_to_metagraph function."""
         for graph in [self.graph_dictionary, self.graph_matrix] :
             
-            complete_graph, routing_tables = graph_to_metagraph(self.graph_dictionary, self.vertices)
+            complete_graph, index_of, routing_tables = graph_to_metagraph(self.graph_dictionary, self.vertices)
         
             # Here, you need to assert that the `complete_graph` and `routing_tables` are what you expect them to be
             # for the given input.
@@ -153,12 +155,39 @@ class TestsTutorial (unittest.TestCase):
                 [float('inf'), 1, 2, 0]
             ])  # This is a placeholder; you should replace it with the expected result.
             expected_routing_tables = {
-                0: {0: None, 5: 0, 6: 5, 10: 5, 7: 6, 11: 10, 2: 7, 3: 7, 16: 11, 17: 16, 21: 16, 22: 17, 15: 16, 8: 7, 20: 15, 13: 8, 18: 17, 19: 18, 23: 18, 14: 19, 24: 19, 9: 8}, 
-                2: {2: None, 3: 2, 7: 2, 6: 7, 5: 6, 0: 5, 10: 5, 11: 10, 16: 11, 8: 7, 17: 16, 21: 16, 13: 8, 22: 17, 15: 16, 20: 15, 18: 17, 19: 18, 23: 18, 14: 19, 24: 19, 9: 8}, 
-                5: {5: None, 0: 5, 6: 5, 10: 5, 7: 6, 11: 10, 2: 7, 3: 7, 16: 11, 17: 16, 21: 16, 22: 17, 15: 16, 8: 7, 20: 15, 13: 8, 18: 17, 19: 18, 23: 18, 14: 19, 24: 19, 9: 8}, 
-                7: {7: None, 2: 7, 3: 7, 6: 7, 5: 6, 0: 5, 10: 5, 11: 10, 16: 11, 8: 7, 17: 16, 21: 16, 13: 8, 22: 17, 15: 16, 20: 15, 18: 17, 19: 18, 23: 18, 14: 19, 24: 19, 9: 8}
+                0: {0: None, 5: 0, 6: 5, 10: 5, 7: 6, 11: 10, 2: 7, 3: 7, 16: 11, 17: 16, 21: 16, 22: 21, 15: 16, 8: 7, 20: 15, 13: 8, 18: 17, 19: 18, 23: 18, 14: 19, 24: 19, 9: 8}, 
+                2: {2: None, 3: 2, 7: 2, 6: 7, 5: 6, 0: 5, 10: 5, 11: 10, 16: 11, 8: 7, 17: 16, 21: 16, 13: 8, 22: 21, 15: 16, 20: 15, 18: 17, 19: 18, 23: 18, 14: 19, 24: 19, 9: 8}, 
+                5: {5: None, 0: 5, 6: 5, 10: 5, 7: 6, 11: 10, 2: 7, 3: 7, 16: 11, 17: 16, 21: 16, 22: 21, 15: 16, 8: 7, 20: 15, 13: 8, 18: 17, 19: 18, 23: 18, 14: 19, 24: 19, 9: 8}, 
+                7: {7: None, 2: 7, 3: 7, 6: 7, 5: 6, 0: 5, 10: 5, 11: 10, 16: 11, 8: 7, 17: 16, 21: 16, 13: 8, 22: 21, 15: 16, 20: 15, 18: 17, 19: 18, 23: 18, 14: 19, 24: 19, 9: 8}
             }
+            
+            # Routing tables are arrays of predecessors, that we convert to dictionaries of explored vertices
+            routing_tables = {vertex: {cell: None if cell == vertex else int(parent) for cell, parent in enumerate(routing_table) if parent != -1 or cell == vertex} for vertex, routing_table in routing_tables.items()}
             self.assertEqual(routing_tables, expected_routing_tables)
+            self.assertEqual(index_of, {0: 0, 2: 1, 5: 2, 7: 3})
+
+    #############################################################################################################################################
+
+    def test_graph_to_metagraph_unit_weights(self):
+        """Test the graph_to_metagraph function when all edges have weight 1."""
+        unit_graph = {vertex: {neighbor: 1 for neighbor in self.graph_dictionary[vertex]} for vertex in self.graph_dictionary}
+        complete_graph, index_of, routing_tables = graph_to_metagraph(unit_graph, self.vertices)
+
+        # Distances are the numbers of moves between vertices of interest
+        expected_complete_graph = numpy.array([[0, 4, 1, 3],
+                                               [4, 0, 3, 1],
+                                               [1, 3, 0, 2],
+                                               [3, 1, 2, 0]])
+        self.assertTrue(numpy.array_equal(complete_graph, expected_complete_graph))
+
+        # Following the routing tables gives routes with as many moves as the distance
+        for vertex_1 in self.vertices:
+            for vertex_2 in self.vertices:
+                route = expand_route([index_of[vertex_1], index_of[vertex_2]], routing_tables, self.vertices, complete_graph)
+                self.assertEqual(route[0], vertex_1)
+                self.assertEqual(route[-1], vertex_2)
+                self.assertEqual(len(route) - 1, complete_graph[index_of[vertex_1], index_of[vertex_2]])
+                self.assertTrue(all(route[i + 1] in unit_graph[route[i]] for i in range(len(route) - 1)))
 
     #############################################################################################################################################
 
@@ -180,6 +209,60 @@ class TestsTutorial (unittest.TestCase):
 
     #############################################################################################################################################
 
+    def test_cached_graph_to_metagraph(self):
+        """Test the cached_graph_to_metagraph function, including when the cache file is damaged."""
+        expected_complete_graph, _, expected_routing_tables = graph_to_metagraph(self.graph_dictionary, self.vertices)
+        with tempfile.TemporaryDirectory() as directory:
+
+            # Computed, then loaded from the file
+            for _ in range(2):
+                complete_graph, index_of, routing_tables = cached_graph_to_metagraph(self.graph_dictionary, self.vertices, directory)
+                self.assertTrue(numpy.array_equal(complete_graph, expected_complete_graph))
+                self.assertTrue(all(numpy.array_equal(routing_tables[vertex], expected_routing_tables[vertex]) for vertex in self.vertices))
+            file_names = os.listdir(directory)
+            self.assertEqual(len(file_names), 1)
+
+            # A truncated file is computed again
+            file_name = os.path.join(directory, file_names[0])
+            with open(file_name, "r+b") as file:
+                file.truncate(os.path.getsize(file_name) // 2)
+            complete_graph, index_of, routing_tables = cached_graph_to_metagraph(self.graph_dictionary, self.vertices, directory)
+            self.assertTrue(numpy.array_equal(complete_graph, expected_complete_graph))
+
+    #############################################################################################################################################
+
+    def test_preprocessing_without_cache(self):
+        """The metagraph cache is disabled by default, so a game writes no file."""
+        self.assertIsNone(METAGRAPH_CACHE_DIRECTORY)
+        with unittest.mock.patch("tsp_1_bis.cached_graph_to_metagraph") as mocked_cache:
+            memory = threading.local()
+            preprocessing(self.graph_dictionary, 5, 5, "rat", {}, {"rat": self.vertices[0]}, self.vertices[1:], [], memory)
+        mocked_cache.assert_not_called()
+        self.assertGreater(len(memory.actions), 0)
+
+    #############################################################################################################################################
+
+    def test_tsp_best_first_zero_distance(self):
+        """Test the tsp_best_first function when two distinct vertices are at distance 0."""
+        complete_graph = numpy.array([[0, 3, 10, 9, 9, 10],
+                                      [3, 0, 11, 6, 6, 11],
+                                      [10, 11, 0, 15, 17, 0],
+                                      [9, 6, 15, 0, 2, 15],
+                                      [9, 6, 17, 2, 0, 17],
+                                      [10, 11, 0, 15, 17, 0]], dtype=numpy.int32)
+
+        # The search must find a route as short as the exhaustive one
+        best_route, best_length = tsp_best_first(complete_graph, 0)
+        self.assertEqual(best_length, tsp_exhaustive(complete_graph, 0)[1])
+        self.assertEqual(best_route[0], 0)
+        self.assertEqual(sorted(best_route), list(range(6)))
+        self.assertEqual(sum(complete_graph[best_route[i], best_route[i + 1]] for i in range(5)), best_length)
+
+        # Without time, the search returns the heuristic route
+        self.assertEqual(tsp_best_first(complete_graph, 0, 0.0), tsp_2_opt(complete_graph, 0))
+
+    #############################################################################################################################################
+
     def test_expand_route(self):
         """
         Unit test for the expand_route function.
@@ -198,6 +281,29 @@ class TestsTutorial (unittest.TestCase):
         # Check if the function’s output matches expected output
         self.assertEqual(result_expanded_route, expected_expanded_route)
 
+    #############################################################################################################################################
+
+    def test_expand_route_bounds(self):
+        """
+        The route is the same with or without the complete graph, and an unreachable pair raises an error instead of a huge allocation.
+        """
+        # A line of three cells, and a fourth cell connected to nothing
+        routing_tables = {0: numpy.array([-1, 0, 1, -1], dtype=numpy.int32),
+                          2: numpy.array([1, 2, -1, -1], dtype=numpy.int32),
+                          3: numpy.array([-1, -1, -1, -1], dtype=numpy.int32)}
+        cell_names = [0, 2, 3]
+        complete_graph = numpy.array([[0, 2, INF], [2, 0, INF], [INF, INF, 0]], dtype=numpy.int32)
+
+        # The bounds given by the complete graph, or the maze size without it, lead to the same route
+        self.assertEqual(expand_route([0, 1], routing_tables, cell_names, complete_graph), [0, 1, 2])
+        self.assertEqual(expand_route([1, 0], routing_tables, cell_names), [2, 1, 0])
+
+        # The isolated cell cannot be reached, with or without the complete graph
+        with self.assertRaises(ValueError):
+            expand_route([0, 2], routing_tables, cell_names, complete_graph)
+        with self.assertRaises(ValueError):
+            expand_route([0, 2], routing_tables, cell_names)
+
 
 #####################################################################################################################################################
 ######################################################################## GO! ########################################################################